@@ -1,46 +1,1934 @@
 import csv
+import os
+import sys
+import json
+import re
+import math
+import heapq
+import hmac
+import hashlib
+import bisect
+import sqlite3
+import random
+import argparse
+import signal
+import tempfile
+import threading
+import queue
+import multiprocessing
+import time
+import platform
+import atexit
+import asyncio
+import functools
+import cProfile
+import pstats
+import io
 import tkinter as tk
-from tkinter import messagebox, simpledialog
-from datetime import datetime, timedelta
+from tkinter import messagebox, simpledialog, ttk, filedialog
+from datetime import datetime, timedelta, date
+from collections import Counter, OrderedDict, deque
+from operator import itemgetter
+from itertools import islice
+from collections.abc import Mapping
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+try:
+    import numpy as np
+except ImportError: # optional: batch billing then works out the same numbers in plain Python
+    np = None
 
 FIXED_ADMIN_USERNAME = "admin"
-FIXED_ADMIN_PASSWORD = "admin123"
+FIXED_ADMIN_PASSWORD = os.environ.get("CAR_RENTAL_ADMIN_PASSWORD", "admin123")  # only used for the admin's first login
 DEFAULT_ADMIN_BALANCE = 10000.0  # Default admin balance
+FLUSH_INTERVAL_MS = 2000  # how often the GUI writes pending changes back to the CSV files
+JOURNAL_GROUP_COMMIT_ROWS = 32  # appended rows are fsync'd together once this many are waiting
+JOURNAL_GROUP_COMMIT_SECONDS = 1.0  # ... or once the oldest unsynced row is this old
+STORAGE_BACKEND = os.environ.get("CAR_RENTAL_BACKEND", "csv")  # "csv" or "sqlite"
+DEFAULT_SERVER_PORT = 8080  # port used by --serve when none is given
+LATE_FEE_FREE_DAYS = 1  # a rental is charged a late fee for every day it is out beyond this
+PASSWORD_HASH = os.environ.get("CAR_RENTAL_PASSWORD_HASH", "scrypt")  # "scrypt" or "pbkdf2"
+SCRYPT_COST = int(os.environ.get("CAR_RENTAL_SCRYPT_COST", 14))  # scrypt n = 2**SCRYPT_COST; each step doubles the login time
+PBKDF2_ITERATIONS = int(os.environ.get("CAR_RENTAL_PBKDF2_ITERATIONS", 600000))
+SESSION_CACHE_SIZE = 10000  # logged-in sessions --serve keeps; the least recently used go first
+SESSION_TTL_SECONDS = 3600  # a session ends after this long without a request
+LOGIN_TARGET_PER_SECOND = 10  # --bench-login fails below this many logins per second
+AVAILABLE_CARS_CACHE_SIZE = 64  # available-car lists remembered (one per date range asked for)
+FEEDBACK_SEARCH_LIMIT = 200  # feedback search returns at most this many (the best) matches
+CAR_SEARCH_PAGE = 50  # cars per page in the car search
+CAR_SEARCH_SORTS = ("price", "seats", "name")  # orders the car search can list models in
+METRICS_ENABLED = os.environ.get("CAR_RENTAL_METRICS", "on") != "off"  # "off": timers and counters do nothing
+METRICS_RECENT = 500  # latest timings kept per operation for the percentiles in the Performance window
+METRICS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # histogram bounds (s)
+PERFORMANCE_REFRESH_MS = 1000  # how often the Performance window updates
+PROFILE_TOP = 30  # functions listed in the --profile summary
+PROFILE_SAMPLE_INTERVAL = 0.005  # seconds between stack samples with --profile-mode sample
+FEEDBACK_STOPWORDS = frozenset("a an and are as at be but by for from i in is it my of on or so the this to "
+                               "was we were with".split())  # too common to be worth indexing
 
 
 class CSVStorable(ABC):
     """Abstract base class for all CSV-storable objects"""
+    __slots__ = () # the subclasses list their attributes in __slots__ (which are also their CSV columns)
 
     @abstractmethod
     def save_to_csv(self):
         pass
 
+    def as_row(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
 
 # File paths
 USERS_FILE = "users.csv"
 CARS_FILE = "cars.csv"
 RENTALS_FILE = "rentals.csv"
 FEEDBACK_FILE = "feedback.csv"
-
-
+SQLITE_FILE = "car_rental.db"
+REDO_LOG_FILE = "redo.log"
+LOCK_FILE = "data.lock"
+SETTLEMENT_LOG_FILE = "settlement.log"
+IMPORT_PROGRESS_ROWS = 1000 # bulk imports report progress this often
+SQLITE_CHANGES_KEPT = 10000 # committed transactions the SQLite backend keeps for other instances to catch up from
+
+# Column order of each CSV file
+USER_FIELDS = ["username", "password", "first_name", "last_name", "address", "balance", "role"]
+CAR_FIELDS = ["car_id", "brand", "model", "seating_capacity", "rental_price_per_day", "is_available"]
+RENTAL_FIELDS = ["username", "car_model", "start_date", "end_date", "rent_amount", "car_id"]
+FEEDBACK_FIELDS = ["username", "car_model", "feedback_text", "timestamp"]
+
+TABLE_FILES = {"users": USERS_FILE, "cars": CARS_FILE, "rentals": RENTALS_FILE, "feedback": FEEDBACK_FILE}
+TABLE_FIELDS = {"users": USER_FIELDS, "cars": CAR_FIELDS, "rentals": RENTAL_FIELDS, "feedback": FEEDBACK_FIELDS}
+COLUMN_TYPES = {"balance": float, "seating_capacity": int, "rental_price_per_day": float, "rent_amount": float}
+
+
+class OperationStats:
+    """Timings of one operation: a histogram over every call, the latest calls, and the I/O
+    counters (rows and bytes read and written) added while it was running"""
+    __slots__ = ("count", "total", "max", "buckets", "recent", "counters")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(METRICS_BUCKETS) + 1) # the last one is everything slower
+        self.recent = deque(maxlen=METRICS_RECENT)
+        self.counters = Counter()
+
+
+class OperationTimer:
+    """Context manager timing one call of an operation (see Metrics.timed)"""
+    __slots__ = ("metrics", "name", "started")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.metrics.active().append(self.name)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = time.perf_counter() - self.started
+        self.metrics.active().pop()
+        self.metrics.observe(self.name, seconds)
+        return False
+
+
+class NoTimer:
+    """Stands in for OperationTimer while metrics are off"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NO_TIMER = NoTimer()
+
+
+class Metrics:
+    """Timers (metrics.timed / @timed) and counters (metrics.count) for the hot paths, exported as JSON or Prometheus text"""
+
+    def __init__(self, enabled=METRICS_ENABLED):
+        self.enabled = enabled
+        self.lock = threading.Lock() # the GUI, the writer thread and the password workers all report here
+        self.local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.operations = {} # name -> OperationStats
+            self.counters = Counter() # totals, also of I/O done outside any timed operation
+            self.started = time.time()
+
+    def active(self):
+        """Names of the operations running on this thread, innermost last"""
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def timed(self, name):
+        return OperationTimer(self, name) if self.enabled else NO_TIMER
+
+    def observe(self, name, seconds):
+        with self.lock:
+            stats = self.operations.get(name) or self.operations.setdefault(name, OperationStats())
+            stats.count += 1
+            stats.total += seconds
+            stats.max = max(stats.max, seconds)
+            stats.buckets[bisect.bisect_left(METRICS_BUCKETS, seconds)] += 1
+            stats.recent.append(seconds)
+
+    def count(self, name, amount=1):
+        if not self.enabled:
+            return
+        running = set(self.active()) # an operation nested in itself counts once
+        with self.lock:
+            self.counters[name] += amount
+            for operation in running:
+                stats = self.operations.get(operation) or self.operations.setdefault(operation, OperationStats())
+                stats.counters[name] += amount
+
+    def snapshot(self):
+        """Everything recorded so far as plain data (what the JSON export holds)"""
+        with self.lock:
+            operations = {name: (stats.count, stats.total, stats.max, list(stats.buckets), list(stats.recent),
+                                 dict(stats.counters)) for name, stats in self.operations.items()}
+            counters = dict(self.counters)
+        report = {}
+        for name, (count, total, slowest, buckets, recent, op_counters) in sorted(operations.items()):
+            cumulative, histogram = 0, {}
+            for bound, hits in zip(list(METRICS_BUCKETS) + ["+Inf"], buckets):
+                cumulative += hits
+                histogram[str(bound)] = cumulative
+            report[name] = dict({"calls": count, "total_seconds": round(total, 6),
+                                 "mean_ms": round(total / count * 1000, 3) if count else 0.0,
+                                 "last_ms": round(recent[-1] * 1000, 3) if recent else 0.0,
+                                 "p50_ms": round(percentile(recent, 0.50) * 1000, 3),
+                                 "p95_ms": round(percentile(recent, 0.95) * 1000, 3),
+                                 "p99_ms": round(percentile(recent, 0.99) * 1000, 3),
+                                 "max_ms": round(slowest * 1000, 3), "histogram": histogram}, **op_counters)
+        return {"started": datetime.fromtimestamp(self.started).isoformat(timespec="seconds"),
+                "enabled": self.enabled, "counters": counters, "operations": report}
+
+    def prometheus(self):
+        """The snapshot in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = ["# HELP car_rental_operation_seconds Time taken by each operation.",
+                 "# TYPE car_rental_operation_seconds histogram"]
+        for name, stats in snapshot["operations"].items():
+            label = json.dumps(name) # quoted and escaped the way Prometheus wants
+            for bound, hits in stats["histogram"].items():
+                lines.append(f'car_rental_operation_seconds_bucket{{operation={label},le="{bound}"}} {hits}')
+            lines.append(f"car_rental_operation_seconds_sum{{operation={label}}} {stats['total_seconds']}")
+            lines.append(f"car_rental_operation_seconds_count{{operation={label}}} {stats['calls']}")
+        for counter in sorted(snapshot["counters"]):
+            lines += [f"# HELP car_rental_{counter}_total {counter.replace('_', ' ').capitalize()}, "
+                      f"by the operations running at the time.", f"# TYPE car_rental_{counter}_total counter",
+                      f"car_rental_{counter}_total {snapshot['counters'][counter]}"]
+            for name, stats in snapshot["operations"].items():
+                if counter in stats:
+                    lines.append(f"car_rental_{counter}_total{{operation={json.dumps(name)}}} {stats[counter]}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, file_path):
+        """Write the metrics to file_path: Prometheus text for .prom/.txt, JSON otherwise"""
+        text = (self.prometheus() if file_path.lower().endswith((".prom", ".txt"))
+                else json.dumps(self.snapshot(), indent=2) + "\n")
+        with open(file_path, mode='w') as file:
+            file.write(text)
+        return file_path
+
+
+metrics = Metrics()
+
+
+def timed(name):
+    """Decorator timing every call of a function as the operation `name` (see Metrics)"""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return function(*args, **kwargs)
+            with OperationTimer(metrics, name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+@timed("read_csv")
 def read_csv(file_path):
     try:
         with open(file_path, mode='r', newline='') as file:
             reader = csv.DictReader(file) #reading data as dictionaries
-            return list(reader)
+            rows = list(reader)
+            metrics.count("rows_read", len(rows))
+            metrics.count("bytes_read", file.buffer.tell())
+            return rows
     except FileNotFoundError:
         return []
 
 
-def write_csv(file_path, data, fieldnames):
+def scan_csv(file_path, columns=None, where=None):
+    """Yield the rows of a CSV file one at a time, as dicts holding only `columns` (default: all).
+    `where` maps a column to the value it must have (or to a function of the value that says
+    whether to keep the row); it is checked on the raw fields before any dict is built, so rows
+    that are skipped cost almost nothing. A missing file yields nothing."""
+    try:
+        file = open(file_path, mode='r', newline='')
+    except FileNotFoundError:
+        return
+    with file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if header is None:
+            return
+        position = {name: i for i, name in enumerate(header)}
+        picks = [(name, position.get(name)) for name in (header if columns is None else columns)]
+        tests = [(position.get(name), test if callable(test) else (lambda value, wanted=test: value == wanted))
+                 for name, test in (where or {}).items()]
+        width = len(header)
+        read = 0
+        try:
+            for record in reader:
+                if not record: # blank line, skipped like DictReader does
+                    continue
+                read += 1
+                if len(record) < width: # short row: the missing fields are None, as with DictReader
+                    record += [None] * (width - len(record))
+                if all(test(record[i] if i is not None else None) for i, test in tests):
+                    yield {name: record[i] if i is not None else None for name, i in picks}
+        finally: # also when the caller stops early
+            metrics.count("rows_read", read)
+            metrics.count("bytes_read", file.buffer.tell())
+
+
+def first_csv_row(file_path, columns=None, where=None):
+    """The first row scan_csv would yield, or None; the file is only read up to that row"""
+    rows = scan_csv(file_path, columns, where)
+    try:
+        return next(rows, None)
+    finally:
+        rows.close()
+
+
+def read_records(file_path):
+    """Yield (row number, values) for each record of a CSV file with a header or of a .jsonl file
+    (one JSON object per line), one at a time. A JSONL line that is not valid JSON gives None."""
+    if not file_path.lower().endswith((".jsonl", ".ndjson")):
+        yield from enumerate(scan_csv(file_path), start=2) # row 1 is the header
+        return
+    with open(file_path, mode='r') as file:
+        for number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                values = json.loads(line)
+            except ValueError:
+                values = None
+            if isinstance(values, dict): # text like a CSV field, so both formats are checked the same way
+                values = {name: "" if value is None else str(value) for name, value in values.items()}
+            yield number, values
+
+
+def export_records(file_path, rows, fieldnames):
+    """Write rows to a CSV file, or to a .jsonl file with one JSON object per line, one row at a
+    time without building the whole file in memory. Returns how many rows were written."""
+    count = 0
+    with open(file_path, mode='w', newline='') as file:
+        if file_path.lower().endswith((".jsonl", ".ndjson")):
+            for row in rows:
+                file.write(json.dumps({name: row[name] for name in fieldnames}) + "\n")
+                count += 1
+        else:
+            writer = csv.DictWriter(file, fieldnames=fieldnames, extrasaction="ignore")
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+    return count
+
+
+@timed("write_csv")
+def write_csv(file_path, data, fieldnames, sync=False):
     with open(file_path, mode='w', newline='') as file:
         writer = csv.DictWriter(file, fieldnames=fieldnames) #writing data as dictionaries
         writer.writeheader()
         writer.writerows(data)
+        file.flush()
+        metrics.count("rows_written", len(data))
+        metrics.count("bytes_written", file.buffer.tell())
+        if sync: # make sure the data is on disk before the file is used
+            os.fsync(file.fileno())
+
+
+class AppendJournal:
+    """Append-only writer for a CSV file: new rows are added at the end instead of rewriting the file.
+    fsync is done for a group of rows at a time (group commit) instead of once per row."""
+
+    def __init__(self, file_path, fieldnames):
+        self.file_path = file_path
+        self.fieldnames = fieldnames
+        self.file = None
+        self.writer = None
+        self.unsynced = 0
+        self.first_unsynced_at = 0.0
+
+    def open(self):
+        self.repair()
+        self.file = open(self.file_path, mode='a', newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=self.fieldnames)
+        if self.file.tell() == 0:
+            self.writer.writeheader()
+
+    def repair(self):
+        """Make sure the file ends with a newline before rows are appended: a last line that is a
+        whole row (e.g. a file edited by hand) gets its newline, a half-written one left behind
+        by a crash is dropped so it is not read back as a row"""
+        try:
+            with open(self.file_path, mode='rb+') as raw:
+                size = raw.seek(0, os.SEEK_END)
+                raw.seek(max(0, size - 4096))
+                tail = raw.read()
+                if not tail or tail.endswith(b"\n"):
+                    return
+                cut = tail.rfind(b"\n")
+                if cut == -1 and size > len(tail):
+                    return  # a single line longer than 4KB; leave the file alone
+                if self.is_whole_row(tail[cut + 1:]):
+                    raw.write(b"\r\n") # the line ending csv.writer uses
+                else:
+                    raw.truncate(size - len(tail) + cut + 1)
+        except FileNotFoundError:
+            pass
+
+    def is_whole_row(self, line):
+        """Whether line (bytes, without its newline) parses into one value per column"""
+        try:
+            values = next(csv.reader([line.decode()], strict=True), [])
+        except (UnicodeDecodeError, csv.Error): # cut inside a character or inside a quoted field
+            return False
+        return len(values) == len(self.fieldnames)
+
+    def append(self, rows):
+        if self.file is None:
+            self.open()
+        position = self.file.buffer.tell()
+        self.writer.writerows(rows)
+        self.file.flush()
+        metrics.count("rows_written", len(rows))
+        metrics.count("bytes_written", self.file.buffer.tell() - position)
+        if not self.unsynced:
+            self.first_unsynced_at = time.monotonic()
+        self.unsynced += len(rows)
+        if (self.unsynced >= JOURNAL_GROUP_COMMIT_ROWS or
+                time.monotonic() - self.first_unsynced_at >= JOURNAL_GROUP_COMMIT_SECONDS):
+            self.sync()
+
+    def sync(self):
+        if self.file is not None and self.unsynced:
+            with metrics.timed("journal fsync"):
+                os.fsync(self.file.fileno())
+            self.unsynced = 0
+
+    def close(self):
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+            self.writer = None
+
+
+class HashIndex:
+    """Maps the case-folded value of one column to the rows holding it (in file order)"""
+
+    def __init__(self, column):
+        self.column = column
+        self.columns = (column,) # the row must be re-indexed when these change
+        self.buckets = {}
+
+    def add(self, row):
+        self.buckets.setdefault(getattr(row, self.column).casefold(), []).append(row)
+
+    def remove(self, row):
+        key = getattr(row, self.column).casefold()
+        bucket = self.buckets.get(key, [])
+        for i, r in enumerate(bucket):
+            if r is row: # rows with equal values are still different rows
+                del bucket[i]
+                break
+        if not bucket:
+            self.buckets.pop(key, None)
+
+    def get(self, value):
+        return self.buckets.get(str(value).casefold(), [])
+
+    def clear(self):
+        self.buckets = {}
+
+
+def rental_period(rental):
+    """(start, end) dates during which a rental holds its car, end excluded. "Ongoing" rentals have no end.
+    Returns None for rows whose dates cannot be read or that cover no day at all."""
+    try:
+        start = datetime.strptime(rental["start_date"], "%Y-%m-%d").date()
+        end = date.max if rental["end_date"] == "Ongoing" else datetime.strptime(rental["end_date"], "%Y-%m-%d").date()
+    except ValueError:
+        return None
+    return (start, end) if end > start else None
+
+
+def rental_is_open(rental, today=None):
+    """Whether the rental holds its car today: an "Ongoing" one until it is returned, others until their end date"""
+    period = rental_period(rental)
+    today = today or date.today()
+    return period is not None and period[0] <= today < period[1]
+
+
+class IntervalIndex:
+    """Booked periods of one car (or model), sorted by start date, with the longest booked length
+    so far. A period overlapping a range must start less than that length before it, so only that
+    slice is looked at; "Ongoing" periods, which never end, are kept apart in their own list."""
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.rentals = []
+        self.lengths = Counter() # days booked -> periods that long
+        self.longest = timedelta(0)
+        self.open_starts = [] # periods without an end
+        self.open_rentals = []
+
+    def __len__(self):
+        return len(self.starts) + len(self.open_starts)
+
+    def add(self, start, end, rental):
+        if end == date.max:
+            i = bisect.bisect_right(self.open_starts, start)
+            self.open_starts.insert(i, start)
+            self.open_rentals.insert(i, rental)
+            return
+        i = bisect.bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.rentals.insert(i, rental)
+        self.lengths[(end - start).days] += 1
+        self.longest = max(self.longest, end - start)
+
+    def remove(self, start, rental):
+        for starts, columns in ((self.starts, (self.starts, self.ends, self.rentals)),
+                                (self.open_starts, (self.open_starts, self.open_rentals))):
+            i = bisect.bisect_left(starts, start)
+            while i < len(starts) and starts[i] == start:
+                if columns[-1][i] is rental:
+                    if starts is self.starts:
+                        self._forget_length((self.ends[i] - start).days)
+                    for values in columns:
+                        del values[i]
+                    return
+                i += 1
+
+    def _forget_length(self, days):
+        self.lengths[days] -= 1
+        if not self.lengths[days]:
+            del self.lengths[days]
+            if timedelta(days=days) == self.longest:
+                self.longest = timedelta(days=max(self.lengths, default=0))
+
+    def _candidates(self, start, end):
+        """Indexes of the finite periods that can overlap [start, end)"""
+        first = bisect.bisect_right(self.starts, start - self.longest) if start - date.min > self.longest else 0
+        return range(first, bisect.bisect_left(self.starts, end))
+
+    def is_free(self, start, end):
+        if self.open_starts and self.open_starts[0] < end:
+            return False
+        return not any(self.ends[i] > start for i in self._candidates(start, end))
+
+    def overlapping(self, start, end):
+        """Rentals whose period overlaps [start, end), by start date"""
+        found = [(self.starts[i], self.rentals[i]) for i in self._candidates(start, end) if self.ends[i] > start]
+        opened = bisect.bisect_left(self.open_starts, end)
+        if opened:
+            found = heapq.merge(found, zip(self.open_starts[:opened], self.open_rentals[:opened]),
+                                key=lambda pair: pair[0])
+        return [rental for start_date, rental in found]
+
+
+class AvailabilityIndex:
+    """An IntervalIndex of booked periods for every car (by car_id), kept up to date as a secondary
+    index of the rentals table. Rentals saved before cars had ids only name the model; those are
+    kept per model and hold every car of that model. Models are matched exactly, as rentals store
+    the model of the car rented."""
+
+    columns = ("car_model", "car_id", "start_date", "end_date")
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.cars = {} # car_id -> IntervalIndex
+        self.models = {} # car_model -> IntervalIndex of the rentals without a car_id
+        self.model_cars = {} # car_model -> Counter of the car_ids booked
+        self.model_periods = {} # car_model -> IntervalIndex of the rentals with a car_id
+        self.max_car_id = 0
+        self.touched = set() # car_ids and (for rentals without one) models whose bookings changed
+
+    def add(self, rental):
+        period = rental_period(rental)
+        if not period:
+            return
+        car_id = rental.car_id
+        self.touched.add(car_id or (rental.car_model,))
+        if not car_id:
+            self.models.setdefault(rental.car_model, IntervalIndex()).add(period[0], period[1], rental)
+            return
+        self.cars.setdefault(car_id, IntervalIndex()).add(period[0], period[1], rental)
+        self.model_periods.setdefault(rental.car_model, IntervalIndex()).add(period[0], period[1], rental)
+        self.model_cars.setdefault(rental.car_model, Counter())[car_id] += 1
+        if car_id.isdigit():
+            self.max_car_id = max(self.max_car_id, int(car_id))
+
+    def remove(self, rental):
+        period = rental_period(rental)
+        if not period:
+            return
+        car_id = rental.car_id
+        self.touched.add(car_id or (rental.car_model,))
+        key, periods_by_key = (car_id, self.cars) if car_id else (rental.car_model, self.models)
+        periods = periods_by_key.get(key)
+        if periods is not None:
+            periods.remove(period[0], rental)
+            if not periods:
+                del periods_by_key[key]
+        periods = self.model_periods.get(rental.car_model) if car_id else None
+        if periods is not None:
+            periods.remove(period[0], rental)
+            if not periods:
+                del self.model_periods[rental.car_model]
+        cars = self.model_cars.get(rental.car_model) if car_id else None
+        if cars is not None:
+            cars[car_id] -= 1
+            if cars[car_id] <= 0:
+                del cars[car_id]
+                if not cars:
+                    del self.model_cars[rental.car_model]
+
+    def is_free(self, car_model, start, end, car_id=None):
+        periods = self.models.get(car_model)
+        if periods is not None and not periods.is_free(start, end):
+            return False
+        return car_id is None or self.car_is_free(car_id, start, end)
+
+    def car_is_free(self, car_id, start, end):
+        """Free as far as the rentals naming this car_id go"""
+        periods = self.cars.get(car_id)
+        return periods is None or periods.is_free(start, end)
+
+    def booked_cars(self, car_model, start, end):
+        """car_ids of this model booked for part of start..end, or None if a rental without a car_id
+        holds every car of the model then. Found in the model's own IntervalIndex, so cars that are
+        free are never looked at."""
+        if not self.is_free(car_model, start, end):
+            return None
+        periods = self.model_periods.get(car_model)
+        return {rental.car_id for rental in periods.overlapping(start, end)} if periods is not None else set()
+
+    def bookings(self, car_model, start, end):
+        """Rentals of any car of this model overlapping start..end"""
+        periods = self.models.get(car_model)
+        found = periods.overlapping(start, end) if periods is not None else []
+        for car_id in self.model_cars.get(car_model, ()):
+            found += self.cars[car_id].overlapping(start, end)
+        return found
+
+
+class FleetPool:
+    """Every car by its car_id, and for each model its cars and its free cars (is_available "True"),
+    kept up to date as a secondary index of the cars table (Repository.sync_availability sets
+    is_available from the bookings); the available and total counts per model are the sizes of the pools."""
+
+    columns = ("car_id", "model", "is_available")
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.by_id = {}
+        self.units = {} # model -> {car_id: car}
+        self.free = {} # model -> {car_id: car}, only the available ones
+        self.max_id = 0
+
+    def add(self, car):
+        if not car.car_id: # numbered right after loading, see Repository.number_cars
+            return
+        self.by_id[car.car_id] = car
+        self.units.setdefault(car.model, {})[car.car_id] = car
+        if car.is_available == "True":
+            self.free.setdefault(car.model, {})[car.car_id] = car
+        if car.car_id.isdigit():
+            self.max_id = max(self.max_id, int(car.car_id))
+
+    def remove(self, car):
+        if not car.car_id:
+            return
+        if self.by_id.get(car.car_id) is car:
+            del self.by_id[car.car_id]
+        for pool in (self.units, self.free):
+            cars = pool.get(car.model)
+            if cars is not None and cars.get(car.car_id) is car:
+                del cars[car.car_id]
+                if not cars:
+                    del pool[car.model]
+
+    def all_units(self, model):
+        return self.units.get(model, {}).values()
+
+    def counts(self, model):
+        """(available, total) cars of this model"""
+        return len(self.free.get(model, ())), len(self.units.get(model, ()))
+
+
+class CarSearchIndex:
+    """Models with a free car, grouped by (brand, seats) and sorted by price and by name for the car search"""
+
+    columns = FleetPool.columns + ("brand", "seating_capacity", "rental_price_per_day")
+
+    def __init__(self, fleet):
+        self.fleet = fleet
+        self.clear()
+
+    def clear(self):
+        self.entries = {} # model -> (brand, seats, price)
+        self.by_price = {} # (case-folded brand, seats) -> [(price, model)]
+        self.by_name = {} # (case-folded brand, seats) -> [(case-folded model, model)]
+        self.unsorted = set() # groups appended to out of order (loading), sorted when next read
+
+    def add(self, car):
+        self.refresh(car.model)
+
+    def remove(self, car):
+        self.refresh(car.model)
+
+    def refresh(self, model):
+        free = self.fleet.free.get(model)
+        car = next(iter(free.values())) if free else None
+        entry = None
+        # seats and price that do not parse (a hand-edited file) cannot be compared, so are left out
+        if car is not None and type(car.seating_capacity) is int and type(car.rental_price_per_day) is float:
+            entry = (car.brand, car.seating_capacity, car.rental_price_per_day)
+        old = self.entries.get(model)
+        if entry == old:
+            return
+        if old is not None:
+            del self.entries[model]
+            group = (old[0].casefold(), old[1])
+            for items, item in zip(self.group(group), ((old[2], model), (model.casefold(), model))):
+                i = bisect.bisect_left(items, item)
+                if i < len(items) and items[i] == item:
+                    del items[i]
+            if not self.by_price[group]:
+                del self.by_price[group], self.by_name[group]
+        if entry is not None:
+            self.entries[model] = entry
+            group = (entry[0].casefold(), entry[1])
+            for lists, item in ((self.by_price, (entry[2], model)), (self.by_name, (model.casefold(), model))):
+                items = lists.setdefault(group, [])
+                if items and item < items[-1]:
+                    self.unsorted.add(group)
+                items.append(item)
+
+    def group(self, group):
+        """The group's (by price, by name) lists, sorted"""
+        if group in self.unsorted:
+            self.by_price[group].sort()
+            self.by_name[group].sort()
+            self.unsorted.discard(group)
+        return self.by_price[group], self.by_name[group]
+
+    def search(self, brand=None, min_seats=None, max_seats=None, min_price=None, max_price=None,
+               sort="price", descending=False, offset=0, limit=CAR_SEARCH_PAGE):
+        """(number of matching models, the page of them from offset on) as dicts with the brand,
+        model, seats, price and how many of the model's cars are available out of how many.
+        Brand is matched ignoring case; the ranges include both ends and None leaves a side open.
+        Sorted by price, by seats (then price) or by brand and model name."""
+        folded = brand.strip().casefold() if brand else None
+        low_price = -math.inf if min_price is None else min_price
+        high_price = math.inf if max_price is None else max_price
+        slices = [] # (group, by price, by name, first, last): the group's models in the price range
+        for group in self.by_price:
+            if (folded is None or group[0] == folded) and (min_seats is None or group[1] >= min_seats) \
+                    and (max_seats is None or group[1] <= max_seats):
+                prices, names = self.group(group)
+                first = bisect.bisect_left(prices, low_price, key=itemgetter(0)) if min_price is not None else 0
+                last = bisect.bisect_right(prices, high_price, key=itemgetter(0)) if max_price is not None else len(prices)
+                if first < last:
+                    slices.append((group, prices, names, first, last))
+        total = sum(last - first for *_, first, last in slices)
+
+        def run(prices, first, last, tag):
+            """The group's models in the price range by price, each as tag + (price, model)"""
+            indexes = range(last - 1, first - 1, -1) if descending else range(first, last)
+            return (tag + prices[i] for i in indexes)
+
+        def by_name(group, prices, names, first, last):
+            """The group's models in the price range by name, as (brand, name, model)"""
+            if last - first < len(prices) // 8: # few are in range: sort just those
+                models = sorted(((group[0], model.casefold(), model) for _, model in prices[first:last]),
+                                reverse=descending)
+                return iter(models)
+            entries = self.entries # most are in range: walk the name order, skipping the others
+            return ((group[0], name, model) for name, model in (reversed(names) if descending else names)
+                    if low_price <= entries[model][2] <= high_price)
+
+        if sort == "name":
+            runs = [by_name(*part) for part in slices]
+        else:
+            runs = [run(prices, first, last, (group[1],) if sort == "seats" else ())
+                    for group, prices, names, first, last in slices]
+        page = islice(heapq.merge(*runs, reverse=descending), offset, offset + limit)
+        return total, [self.describe(item[-1]) for item in page]
+
+    def describe(self, model):
+        brand, seats, price = self.entries[model]
+        available, total = self.fleet.counts(model)
+        return {"brand": brand, "model": model, "seating_capacity": seats, "rental_price_per_day": price,
+                "available": available, "total": total, "availability": f"{available} of {total}"}
+
+
+class ChangeCounter:
+    """Counts the changes made to a table. It is attached like an index, so no insert, update,
+    delete, rollback or reload can get past it."""
+
+    def __init__(self, columns):
+        self.columns = tuple(columns) # an update of any of these counts
+        self.count = 0
+
+    def add(self, row):
+        self.count += 1
+
+    def remove(self, row):
+        self.count += 1
+
+    def clear(self):
+        self.count += 1
+
+
+class AvailableCarsCache:
+    """Memoized available-car lists, one per date range. A list is kept with the change counts of
+    the cars and rentals tables and today's date, and handed out again only while all three are
+    the same, so adding, removing, renting or returning a car (here or in another instance) makes
+    the next call recompute. Keeps the `size` most recently used lists."""
+
+    def __init__(self, cars, rentals, size=AVAILABLE_CARS_CACHE_SIZE):
+        self.cars = cars.attach_index("changes", ChangeCounter(cars.fieldnames))
+        self.rentals = rentals.attach_index("changes", ChangeCounter(AvailabilityIndex.columns))
+        self.size = size
+        self.entries = OrderedDict() # (start date, end date) -> (version, cars)
+        self.hits = 0
+        self.misses = 0
+
+    def version(self):
+        return self.cars.count, self.rentals.count, date.today()
+
+    def get(self, key, compute):
+        """The list for key, calling compute() only if there is none for the current data"""
+        version = self.version() # read before computing: a change made meanwhile makes the result stale
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[1]
+        self.misses += 1
+        cars = compute()
+        self.entries[key] = (version, cars)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        return cars
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
+
+
+class RentalAnalytics:
+    """Running totals over the rentals table: revenue by car model, by customer and by day, the
+    number of rentals and the days booked per model. It is attached to the table like an index,
+    so every insert, update, delete and rollback adjusts the totals and the admin dashboard never
+    rescans the rental history. Rentals out right now are counted from the AvailabilityIndex."""
+
+    columns = ("username", "car_model", "start_date", "end_date", "rent_amount")
+
+    def __init__(self, availability):
+        self.availability = availability
+        self.clear()
+
+    def clear(self):
+        self.total_revenue = 0.0
+        self.rental_count = 0
+        self.revenue_by_model = Counter()
+        self.rentals_by_model = Counter()
+        self.days_by_model = Counter()
+        self.revenue_by_user = Counter()
+        self.rentals_by_user = Counter()
+        self.revenue_by_day = Counter()
+        self.rentals_by_day = Counter()
+
+    def _count(self, rental, sign):
+        amount = rental.rent_amount if isinstance(rental.rent_amount, float) else 0.0 # unreadable amounts count as 0
+        period = rental_period(rental)
+        days = (period[1] - period[0]).days if period and period[1] != date.max else 0
+        model, username, day = rental.car_model, rental.username, rental.start_date
+
+        self.total_revenue += sign * amount
+        self.rental_count += sign
+        self.revenue_by_model[model] += sign * amount
+        self.rentals_by_model[model] += sign
+        self.days_by_model[model] += sign * days
+        self.revenue_by_user[username] += sign * amount
+        self.rentals_by_user[username] += sign
+        self.revenue_by_day[day] += sign * amount
+        self.rentals_by_day[day] += sign
+
+        if sign < 0: # forget keys with no rentals left instead of keeping zeros around
+            for counts, totals, key in ((self.rentals_by_model, (self.revenue_by_model, self.days_by_model), model),
+                                        (self.rentals_by_user, (self.revenue_by_user,), username),
+                                        (self.rentals_by_day, (self.revenue_by_day,), day)):
+                if counts[key] <= 0:
+                    for values in (counts,) + totals:
+                        del values[key]
+
+    def add(self, rental):
+        self._count(rental, 1)
+
+    def remove(self, rental):
+        self._count(rental, -1)
+
+    def active_rentals(self, car_model, today=None):
+        today = today or date.today()
+        return len(self.availability.bookings(car_model, today, today + timedelta(days=1)))
+
+    def by_model(self, fleet_size=None):
+        """One dict per car model, highest revenue first. fleet_size(model) -> number of cars of
+        that model, used for the share of the fleet that is out right now."""
+        report = []
+        for model, revenue in self.revenue_by_model.most_common():
+            active = self.active_rentals(model)
+            cars = fleet_size(model) if fleet_size else 0
+            report.append({"car_model": model, "rentals": self.rentals_by_model[model], "revenue": round(revenue, 2),
+                           "days_booked": self.days_by_model[model], "active": active,
+                           "utilization": f"{min(active, cars) / cars:.0%}" if cars else "-"})
+        return report
+
+    def top_customers(self, limit=None):
+        return [{"username": username, "rentals": self.rentals_by_user[username], "revenue": round(revenue, 2)}
+                for username, revenue in self.revenue_by_user.most_common(limit)]
+
+    def by_day(self):
+        """Revenue per rental start day, latest day first"""
+        return [{"day": day, "rentals": self.rentals_by_day[day], "revenue": round(self.revenue_by_day[day], 2)}
+                for day in sorted(self.revenue_by_day, reverse=True)]
+
+
+def feedback_terms(text):
+    """The words of a feedback text that are indexed: lower case letters and digits, no stopwords"""
+    return [word for word in re.findall(r"[a-z0-9]+", (text or "").casefold()) if word not in FEEDBACK_STOPWORDS]
+
+
+class FeedbackIndex:
+    """Inverted index over the feedback table: every word maps to the entries using it, each with a
+    weight for ranking, and entries are also grouped by car model and by customer and kept in
+    timestamp order. It is attached to the table like an index, so every insert (give_feedback,
+    Feedback.save_to_csv), delete and rollback updates it and searching never reads all feedback."""
+
+    columns = ("username", "car_model", "feedback_text", "timestamp")
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.entries = {} # id(row) -> row
+        self.postings = {} # word -> {id(row): weight}
+        self.by_model = {} # case-folded car model -> ids
+        self.by_user = {} # case-folded username -> ids
+        self.by_time = [] # (timestamp, id(row)), sorted once a search needs it
+        self.time_sorted = True
+
+    def add(self, row):
+        key = id(row)
+        self.entries[key] = row
+        counts = Counter(feedback_terms(row.feedback_text))
+        length = math.sqrt(sum(counts.values())) or 1.0
+        for word, count in counts.items(): # a word repeated in a short text weighs the most
+            self.postings.setdefault(word, {})[key] = (1 + math.log(count)) / length
+        self.by_model.setdefault((row.car_model or "").casefold(), set()).add(key)
+        self.by_user.setdefault((row.username or "").casefold(), set()).add(key)
+        entry = (row.timestamp or "", key)
+        if self.by_time and entry < self.by_time[-1]: # loading old files: sort once later, not per row
+            self.time_sorted = False
+        self.by_time.append(entry)
+
+    def _sorted_by_time(self):
+        if not self.time_sorted:
+            self.by_time.sort()
+            self.time_sorted = True
+        return self.by_time
+
+    def remove(self, row):
+        key = id(row)
+        if self.entries.pop(key, None) is None:
+            return
+        for word in set(feedback_terms(row.feedback_text)):
+            postings = self.postings.get(word)
+            if postings is not None:
+                postings.pop(key, None)
+                if not postings:
+                    del self.postings[word]
+        for groups, name in ((self.by_model, row.car_model), (self.by_user, row.username)):
+            keys = groups.get((name or "").casefold())
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del groups[(name or "").casefold()]
+        by_time = self._sorted_by_time()
+        i = bisect.bisect_left(by_time, (row.timestamp or "", key))
+        if i < len(by_time) and by_time[i][1] == key:
+            del by_time[i]
+
+    def search(self, keywords="", car_model=None, username=None, start_date=None, end_date=None,
+               limit=FEEDBACK_SEARCH_LIMIT):
+        """(number of matches, the best `limit` of them as dicts with a score). Every keyword has to
+        appear; matches are ranked by their keyword weights, rarer words counting more, and are
+        newest first without keywords. Model and customer are matched ignoring case, and the dates
+        (end included) are compared with the timestamp."""
+        words = list(dict.fromkeys(feedback_terms(keywords)))
+        groups = [group.get(name.casefold(), set()) for group, name in ((self.by_model, car_model),
+                                                                         (self.by_user, username)) if name]
+        low = str(start_date) if start_date else ""
+        high = str(end_date + timedelta(days=1)) if end_date else None
+
+        def in_range(key):
+            timestamp = self.entries[key].timestamp or ""
+            return timestamp >= low and (high is None or timestamp < high)
+
+        if not words and not groups: # a date range alone is a slice of the timestamp order
+            by_time = self._sorted_by_time()
+            first = bisect.bisect_left(by_time, (low,))
+            last = bisect.bisect_left(by_time, (high,)) if high else len(by_time)
+            best = [by_time[i][1] for i in reversed(range(max(first, last - limit), last))]
+            return last - first, [dict(self.entries[key], score=0.0) for key in best]
+
+        postings = [self.postings.get(word, {}) for word in words]
+        # intersect the smallest first; & on sets and dict keys runs in C over the smaller side
+        sources = sorted([p.keys() for p in postings] + groups, key=len)
+        keys = sources[0]
+        for other in sources[1:]:
+            keys = keys & other
+        if start_date or end_date:
+            keys = [key for key in keys if in_range(key)]
+
+        if not postings:
+            best = heapq.nlargest(limit, keys, key=lambda key: self.entries[key].timestamp or "")
+            return len(keys), [dict(self.entries[key], score=0.0) for key in best]
+
+        # score = sum of idf * weight over the keywords, rarer words counting more; map() keeps the
+        # per-match work in C, which matters when a common word matches millions of entries
+        keys = list(keys)
+        scores = None
+        for p in postings:
+            idf = math.log(1 + len(self.entries) / (1 + len(p)))
+            weighted = map(idf.__mul__, map(p.__getitem__, keys))
+            scores = list(weighted) if scores is None else list(map(float.__add__, scores, weighted))
+        best = heapq.nlargest(limit, zip(scores, keys))
+        return len(keys), [dict(self.entries[key], score=round(score, 3)) for score, key in best]
+
+
+def typed(column, value):
+    """value converted to the column's type from COLUMN_TYPES (text for the other columns).
+    Anything that does not parse is kept as text; a missing value becomes "". Text is interned,
+    so the many rows repeating a model name, date or flag share one string object."""
+    if value is None:
+        return ""
+    kind = COLUMN_TYPES.get(column, str)
+    if kind is str:
+        return sys.intern(value if type(value) is str else str(value))
+    if type(value) is kind:
+        return value
+    try:
+        return kind(value)
+    except ValueError:
+        return sys.intern(str(value))
+
+
+class Row(Mapping):
+    """One table row that remembers its id inside its table. It reads like a read-only dict
+    (row["balance"], row.get(...), dict(row)), but the values sit in slots instead of a dict per
+    row, and numbers are parsed once when the row is loaded. Each table has its own subclass
+    made by Row.for_table(); only the Table changes the values."""
+    __slots__ = ("rowid",)
+    fields = ()
+    field_set = frozenset()
+
+    @classmethod
+    def for_table(cls, name, fieldnames):
+        return type(f"{name.title()}Row", (cls,), {"__slots__": tuple(fieldnames), "fields": tuple(fieldnames),
+                                                   "field_set": frozenset(fieldnames)})
+
+    def __init__(self, values):
+        for name in self.fields:
+            setattr(self, name, typed(name, values.get(name)))
+
+    def set_values(self, values):
+        for name, value in values.items():
+            setattr(self, name, value)
+
+    def __getitem__(self, name):
+        if name in self.field_set:
+            return getattr(self, name)
+        raise KeyError(name)
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self)!r})"
+
+
+class Table:
+    """In-memory copy of one table. Changes are made here, remembered in self.changes as
+    (operation, row, values before the change) and handed to the storage backend by Repository.flush()"""
+
+    def __init__(self, name, fieldnames, append_only=False):
+        self.name = name
+        self.fieldnames = fieldnames
+        self.append_only = append_only # rows are mostly added, so the CSV backend appends them
+        self.row_type = Row.for_table(name, fieldnames)
+        self.rows = [] # always sorted by rowid
+        self.next_rowid = 1
+        self.changes = [] # not yet written by the backend
+        self.indexes = {}
+
+    def add_index(self, column):
+        self.attach_index(column, HashIndex(column))
+
+    def attach_index(self, name, index):
+        """Keep any index object (with columns, add, remove and clear) up to date with this table"""
+        for row in self.rows:
+            index.add(row)
+        self.indexes[name] = index
+        return index
+
+    def lookup(self, column, value):
+        """Rows whose column equals value, ignoring case (uses the hash index on that column)"""
+        return self.indexes[column].get(value)
+
+    def get(self, rowid):
+        i = bisect.bisect_left(self.rows, rowid, key=lambda row: row.rowid)
+        if i < len(self.rows) and self.rows[i].rowid == rowid:
+            return self.rows[i]
+        return None
+
+    def load(self, records):
+        """Replace the contents with (rowid, values) pairs read by a storage backend"""
+        self.rows = []
+        self.next_rowid = 1
+        self.changes = []
+        for index in self.indexes.values():
+            index.clear()
+        for rowid, values in records:
+            self._attach(values, rowid)
+
+    def renumber(self):
+        """Give the rows ids 1..n again, matching their line numbers in a freshly written CSV file"""
+        for rowid, row in enumerate(self.rows, start=1):
+            row.rowid = rowid
+        self.next_rowid = len(self.rows) + 1
+
+    def _attach(self, values, rowid=None):
+        row = self.row_type(values)
+        row.rowid = self.next_rowid if rowid is None else rowid
+        self.next_rowid = max(self.next_rowid, row.rowid + 1)
+        self.rows.append(row)
+        for index in self.indexes.values():
+            index.add(row)
+        return row
+
+    def _detach(self, row):
+        for index in self.indexes.values():
+            index.remove(row)
+        self.rows = [r for r in self.rows if r is not row]
+
+    def _set(self, row, values):
+        changed = [index for index in self.indexes.values()
+                   if any(column in values and values[column] != row[column] for column in index.columns)]
+        for index in changed:
+            index.remove(row)
+        row.set_values(values)
+        for index in changed:
+            index.add(row)
+
+    @property
+    def dirty(self):
+        return bool(self.changes)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def find(self, predicate):
+        """Return the first row matching predicate, or None"""
+        return next((row for row in self.rows if predicate(row)), None)
+
+    def filter(self, predicate):
+        return [row for row in self.rows if predicate(row)]
+
+    def insert(self, values):
+        row = self._attach({name: values.get(name) for name in self.fieldnames})
+        self.changes.append(("insert", row, None))
+        return row
+
+    def update(self, row, values):
+        before = dict(row)
+        self._set(row, {name: typed(name, value) for name, value in values.items() if name in self.fieldnames})
+        self.changes.append(("update", row, before))
+        return row
+
+    def delete_where(self, predicate):
+        """Delete every matching row and return how many were removed"""
+        return self.delete([row for row in self.rows if predicate(row)])
+
+    def delete(self, rows):
+        """Delete the given rows and return how many were removed"""
+        rows = list(rows) # may be an index bucket, which shrinks below
+        doomed = {id(row) for row in rows}
+        if not doomed:
+            return 0
+        for row in rows:
+            for index in self.indexes.values():
+                index.remove(row)
+            self.changes.append(("delete", row, None))
+        self.rows = [row for row in self.rows if id(row) not in doomed]
+        return len(doomed)
+
+    def mark(self):
+        return len(self.changes), self.next_rowid
+
+    def rollback(self, mark):
+        """Undo every change made after mark (taken with self.mark())"""
+        count, next_rowid = mark
+        for operation, row, before in reversed(self.changes[count:]):
+            if operation == "insert":
+                self._detach(row)
+            elif operation == "update":
+                self._set(row, before)
+            else:
+                self.rows.insert(bisect.bisect_left(self.rows, row.rowid, key=lambda r: r.rowid), row)
+                for index in self.indexes.values():
+                    index.add(row)
+        del self.changes[count:]
+        self.next_rowid = next_rowid
+
+
+class StorageBackend(ABC):
+    """Where the tables live on disk. The repository keeps the data in memory and
+    only asks the backend to load it once, to commit transactions and to write changes on flush."""
+
+    stores_commits = False # commit() and flush() write the tables themselves: a flush is then no
+                           # checkpoint, and transactions read back from other instances are already stored
+
+    @abstractmethod
+    def load_rows(self, table):
+        """Return (rowid, values) pairs for every stored row of the table"""
+        pass
+
+    @abstractmethod
+    def flush(self, tables):
+        """Write the pending changes of the given tables. Returns the tables whose files were
+        rewritten from their rows, which the repository then renumbers."""
+        pass
+
+    def commit(self, entries):
+        """Make one transaction durable. entries are (table, operation, row) triples.
+        Returns True if the changes were written to storage too, so flush() can skip them."""
+        return False
+
+    def recover(self):
+        """Called before loading: finish or discard work interrupted by a crash"""
+        pass
+
+    def committed_transactions(self):
+        """Transactions committed but not yet written to the tables (replayed after loading)"""
+        return []
+
+    def read_new_transactions(self):
+        """Transactions committed by other instances since we last looked, or None if
+        the backend cannot tell (the repository then reloads everything)"""
+        return None
+
+    def close(self):
+        pass
+
+
+class RedoLog:
+    """Committed transactions of the CSV backend, one JSON line each. A booking is durable as soon as
+    its line is fsync'd (one fsync per transaction); the CSV files are updated later by a checkpoint,
+    after which the log is emptied. A checkpoint line lists the temp files that replace the CSV files."""
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.offset = 0 # how far this process has read (or written) the log
+
+    @timed("redo log append")
+    def append(self, record):
+        with open(self.file_path, mode='ab') as file:
+            metrics.count("bytes_written", file.write((json.dumps(record) + "\n").encode()))
+            file.flush()
+            os.fsync(file.fileno())
+            self.offset = file.tell()
+
+    def records(self):
+        """Every record in the log"""
+        self.offset = 0
+        return self.read_new()
+
+    def read_new(self):
+        """Records added since the last read (by this or another instance)"""
+        records = []
+        try:
+            with open(self.file_path, mode='rb+') as file:
+                file.seek(self.offset)
+                for line in file:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("incomplete line")
+                        records.append(json.loads(line))
+                    except ValueError:
+                        file.truncate(self.offset) # torn last line: that transaction never committed
+                        break
+                    self.offset += len(line)
+        except FileNotFoundError:
+            pass
+        return records
+
+    def truncate(self):
+        if os.path.exists(self.file_path):
+            os.remove(self.file_path)
+        self.offset = 0
+
+
+def fsync_dir(path):
+    """Make renames inside a directory durable (not possible on Windows, where it is skipped)"""
+    try:
+        fd = os.open(path or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class CSVBackend(StorageBackend):
+    """The original storage: one CSV file per table. Transactions go to a redo log; flush is a checkpoint
+    that appends new rows of append_only tables through an AppendJournal and replaces any other changed
+    file atomically (write to a temp file, then os.replace)."""
+
+    def __init__(self, data_dir="."):
+        self.data_dir = data_dir
+        self.journals = {}
+        self.redo_log = RedoLog(os.path.join(data_dir, REDO_LOG_FILE))
+        self.current_headers = set() # tables whose file is known to have today's columns
+
+    def has_current_header(self, table):
+        """Whether rows can be appended to the table's file: it is missing or has today's columns
+        (a file from before a column was added is rewritten once instead)"""
+        if table.name not in self.current_headers:
+            try:
+                with open(self.path(table), newline='') as file:
+                    header = next(csv.reader(file), None)
+            except FileNotFoundError:
+                header = None
+            if header not in (None, table.fieldnames):
+                return False
+            self.current_headers.add(table.name)
+        return True
+
+    def path(self, table):
+        return os.path.join(self.data_dir, TABLE_FILES[table.name])
+
+    def journal(self, table):
+        if table.name not in self.journals:
+            self.journals[table.name] = AppendJournal(self.path(table), table.fieldnames)
+        return self.journals[table.name]
+
+    def load_rows(self, table):
+        if table.append_only:
+            self.journal(table).close()
+            self.journal(table).repair()
+        return enumerate(scan_csv(self.path(table), table.fieldnames), start=1) # streamed, never a full list
+
+    def commit(self, entries):
+        self.redo_log.append({"transaction": [[table.name, operation, row.rowid, dict(row)]
+                                              for table, operation, row in entries]})
+        return False
+
+    def flush(self, tables):
+        replaced = []
+        for table in tables:
+            if (table.append_only and all(operation == "insert" for operation, row, before in table.changes)
+                    and self.has_current_header(table)):
+                self.journal(table).append([row for operation, row, before in table.changes])
+                continue
+            if table.name in self.journals:
+                self.journals[table.name].close()
+            temp_path = self.path(table) + ".tmp"
+            write_csv(temp_path, table.rows, table.fieldnames, sync=True)
+            replaced.append((table, temp_path))
+        for journal in self.journals.values():
+            journal.sync()
+        if replaced:
+            # from here on recovery finishes the renames instead of replaying the redo log
+            self.redo_log.append({"checkpoint": [[temp_path, self.path(table)] for table, temp_path in replaced]})
+            for table, temp_path in replaced:
+                os.replace(temp_path, self.path(table))
+            fsync_dir(self.data_dir)
+        self.redo_log.truncate()
+        return [table for table, temp_path in replaced]
+
+    def recover(self):
+        records = self.redo_log.records()
+        if records and "checkpoint" in records[-1]:
+            for temp_path, path in records[-1]["checkpoint"]:
+                if os.path.exists(temp_path):
+                    os.replace(temp_path, path)
+            fsync_dir(self.data_dir)
+            self.redo_log.truncate()
+        for name in TABLE_FILES.values():
+            temp_path = os.path.join(self.data_dir, name) + ".tmp"
+            if os.path.exists(temp_path):
+                os.remove(temp_path) # a checkpoint that never committed
+
+    def committed_transactions(self):
+        return [record["transaction"] for record in self.redo_log.records() if "transaction" in record]
+
+    def read_new_transactions(self):
+        return [record["transaction"] for record in self.redo_log.read_new() if "transaction" in record]
+
+    def close(self):
+        for journal in self.journals.values():
+            journal.close()
+
+
+class SQLiteBackend(StorageBackend):
+    """All four tables in one SQLite database (WAL mode). Values are kept as TEXT exactly as in the
+    CSV files; the rowid column is the row id used by the repository. Each transaction is written
+    straight away as one SQLite transaction, together with a row of the changes table, from which
+    other instances read what changed instead of loading everything again."""
+
+    INDEXES = {
+        "users": ["username"],
+        "cars": ["car_id", "model"],
+        "rentals": ["username", "car_id, start_date"],
+        "feedback": ["car_model", "username"],
+    }
+    OLD_INDEXES = ["users_username", "cars_model", "cars_is_available", "rentals_username", "rentals_car_model",
+                   "rentals_end_date", "feedback_car_model", "feedback_username"] # COLLATE NOCASE, so never used
+    stores_commits = True
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.statements = {}
+        self.seen = 0 # last changes row read (or written) by this instance
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS changes (seq INTEGER PRIMARY KEY, changes TEXT NOT NULL)")
+            for index in self.OLD_INDEXES:
+                self.connection.execute(f"DROP INDEX IF EXISTS {index}")
+            for name, fieldnames in TABLE_FIELDS.items():
+                columns = ", ".join(f"{column} TEXT NOT NULL DEFAULT ''" for column in fieldnames)
+                self.connection.execute(f"CREATE TABLE IF NOT EXISTS {name} (rowid INTEGER PRIMARY KEY, {columns})")
+                existing = {record[1] for record in self.connection.execute(f"PRAGMA table_info({name})")}
+                for column in fieldnames: # databases made before a column was added
+                    if column not in existing:
+                        self.connection.execute(f"ALTER TABLE {name} ADD COLUMN {column} TEXT NOT NULL DEFAULT ''")
+                for columns in self.INDEXES[name]: # same (BINARY) collation as the = the app compares with
+                    index = f"{name}_by_{columns.replace(', ', '_')}"
+                    self.connection.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {name} ({columns})")
+                self.statements[name] = {
+                    "insert": f"INSERT OR REPLACE INTO {name} (rowid, {', '.join(fieldnames)}) "
+                              f"VALUES (?, {', '.join('?' for _ in fieldnames)})",
+                    "update": f"UPDATE {name} SET {', '.join(f'{column} = ?' for column in fieldnames)} "
+                              f"WHERE rowid = ?",
+                    "delete": f"DELETE FROM {name} WHERE rowid = ?",
+                }
+
+    def load_rows(self, table):
+        cursor = self.connection.execute(f"SELECT rowid, {', '.join(table.fieldnames)} FROM {table.name} ORDER BY rowid")
+        read = 0
+        try:
+            for record in cursor:
+                read += 1
+                yield record[0], dict(zip(table.fieldnames, record[1:]))
+        finally:
+            metrics.count("rows_read", read)
+
+    def _execute(self, table, operation, row):
+        statements = self.statements[table.name] # same SQL text every time, so sqlite3 reuses the prepared statement
+        values = [row[column] for column in table.fieldnames]
+        if operation == "insert":
+            self.connection.execute(statements["insert"], [row.rowid] + values)
+        elif operation == "update":
+            self.connection.execute(statements["update"], values + [row.rowid])
+        else:
+            self.connection.execute(statements["delete"], [row.rowid])
+
+    def _log(self, entries):
+        """Record the changes for other instances (inside the same SQLite transaction)"""
+        cursor = self.connection.execute("INSERT INTO changes (changes) VALUES (?)", (json.dumps(
+            [[table.name, operation, row.rowid, dict(row)] for table, operation, row in entries]),))
+        self.seen = cursor.lastrowid
+        self.connection.execute("DELETE FROM changes WHERE seq <= ?", (self.seen - SQLITE_CHANGES_KEPT,))
+
+    def commit(self, entries):
+        with self.connection:
+            for table, operation, row in entries:
+                self._execute(table, operation, row)
+            self._log(entries)
+        metrics.count("rows_written", len(entries))
+        return True
+
+    def flush(self, tables):
+        entries = [(table, operation, row) for table in tables for operation, row, before in table.changes]
+        with self.connection: # one transaction per flush
+            for table, operation, row in entries:
+                self._execute(table, operation, row)
+            self._log(entries)
+        metrics.count("rows_written", len(entries))
+
+    def recover(self):
+        # called before loading, under the data lock: what is loaded includes every change so far
+        self.seen = self.connection.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    def read_new_transactions(self):
+        records = self.connection.execute("SELECT seq, changes FROM changes WHERE seq > ? ORDER BY seq",
+                                          (self.seen,)).fetchall()
+        if records and records[0][0] != self.seen + 1:
+            return None # fell too far behind: the ones we missed are gone
+        if records:
+            self.seen = records[-1][0]
+        return [json.loads(changes) for seq, changes in records]
+
+    def import_csv(self, data_dir="."):
+        """One-shot copy of the CSV files into the database (replaces what is there). Returns row counts."""
+        counts = {}
+        tables = {name: list(scan_csv(os.path.join(data_dir, TABLE_FILES[name]), fieldnames))
+                  for name, fieldnames in TABLE_FIELDS.items()}
+        self.number_cars(tables["cars"], tables["rentals"])
+        with self.connection:
+            for name, fieldnames in TABLE_FIELDS.items():
+                rows = tables[name]
+                self.connection.execute(f"DELETE FROM {name}")
+                cursor = self.connection.executemany(
+                    self.statements[name]["insert"],
+                    ([rowid] + [row[column] or "" for column in fieldnames] for rowid, row in enumerate(rows, start=1))
+                )
+                counts[name] = max(cursor.rowcount, 0)
+            self.connection.execute("DELETE FROM changes") # nothing to catch up from: every instance loads the import
+        return counts
+
+    @staticmethod
+    def number_cars(cars, rentals):
+        """Repository.number_cars for the imported cars, so their ids are in the database from the start"""
+        taken = {car["car_id"] for car in cars if car["car_id"]}
+        ids = [int(car_id) for car_id in taken | {rental["car_id"] or "" for rental in rentals} if car_id.isdigit()]
+        max_id = max(ids, default=0)
+        for rowid, car in enumerate(cars, start=1):
+            if not car["car_id"]:
+                car_id = rowid if str(rowid) not in taken else max_id + 1
+                max_id = max(max_id, car_id)
+                car["car_id"] = str(car_id)
+                taken.add(car["car_id"])
+
+    def close(self):
+        self.connection.close()
+
+
+class DataLock:
+    """Exclusive lock shared by every app instance (and thread) using the same data directory:
+    fcntl.flock on POSIX, msvcrt.locking on Windows. The lock file also holds two counters,
+    bumped on every commit and every checkpoint, so an instance can tell that its copy is stale."""
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.file = None
+        self.depth = 0
+        self.thread_lock = threading.RLock()
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        if self.depth == 0:
+            if self.file is None:
+                self.file = os.fdopen(os.open(self.file_path, os.O_RDWR | os.O_CREAT), mode='r+')
+            try:
+                if fcntl:
+                    with metrics.timed("lock wait"): # long waits mean other instances hold the lock
+                        fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+                else:
+                    self.file.seek(0)
+                    while True:
+                        try:
+                            msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError: # LK_LOCK gives up after 10 seconds
+                            pass
+            except BaseException:
+                self.thread_lock.release()
+                raise
+        self.depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.depth -= 1
+        if self.depth == 0:
+            if fcntl:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+            else:
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        self.thread_lock.release()
+
+    def read(self):
+        """(commits, checkpoints) counters; only valid while the lock is held"""
+        self.file.seek(0)
+        try:
+            version, checkpoints = self.file.read().split()
+            return int(version), int(checkpoints)
+        except ValueError:
+            return 0, 0
+
+    def write(self, version, checkpoints):
+        self.file.seek(0)
+        self.file.truncate()
+        self.file.write(f"{version} {checkpoints}\n")
+        self.file.flush()
+
+    def close(self):
+        if self.file is not None and self.depth == 0:
+            self.file.close()
+            self.file = None
+
+
+def make_backend(data_dir="."):
+    """Storage backend picked by STORAGE_BACKEND ("csv" or "sqlite")"""
+    if STORAGE_BACKEND == "sqlite":
+        return SQLiteBackend(os.path.join(data_dir, SQLITE_FILE))
+    if STORAGE_BACKEND == "csv":
+        return CSVBackend(data_dir)
+    raise ValueError(f"Unknown storage backend: {STORAGE_BACKEND}")
+
+
+class Repository:
+    """Loads every table once and keeps it in memory; changes are written back by flush() (write-behind).
+    Changes that belong together (e.g. car, rental and balance of one booking) are grouped
+    with `with repository.transaction():` so they are committed or rolled back together.
+    Transactions and flushes hold the data lock and first catch up with what other app
+    instances sharing the data directory have committed. Threads share it through `access`, held
+    while the tables or their indexes are changed (always after the data lock) or read from another
+    thread (see reads), so no change is seen half made. Only writers take the data lock, and
+    they change the tables only while holding it, so commits and flushes write to disk without
+    holding `access`."""
+
+    def __init__(self, data_dir=".", backend=None):
+        self.data_dir = data_dir
+        self.backend = backend or make_backend(data_dir)
+        self.lock = DataLock(os.path.join(data_dir, LOCK_FILE))
+        self.version = None # lock file counters as of our last load/refresh
+        self.checkpoints = None
+        self.users = Table("users", USER_FIELDS)
+        self.cars = Table("cars", CAR_FIELDS)
+        self.rentals = Table("rentals", RENTAL_FIELDS, append_only=True)
+        self.feedback = Table("feedback", FEEDBACK_FIELDS, append_only=True)
+        self.transaction_depth = 0
+        self.access = threading.RLock()
+        self.availability_day = None # the day is_available was last worked out for every car
+
+        # Hash indexes, kept up to date by every insert/update/delete
+        self.users.add_index("username")
+        self.cars.add_index("car_id")
+        self.cars.add_index("model")
+        self.cars.add_index("is_available")
+        self.rentals.add_index("username")
+        self.rentals.add_index("car_model")
+        self.availability = self.rentals.attach_index("periods", AvailabilityIndex())
+        self.fleet = self.cars.attach_index("fleet", FleetPool())
+        self.car_search = self.cars.attach_index("search", CarSearchIndex(self.fleet))
+        self.analytics = self.rentals.attach_index("analytics", RentalAnalytics(self.availability))
+        self.available_cache = AvailableCarsCache(self.cars, self.rentals)
+        self.feedback_index = self.feedback.attach_index("search", FeedbackIndex())
+
+    def tables(self):
+        return [self.users, self.cars, self.rentals, self.feedback]
+
+    def car_is_free(self, car, start_date, end_date):
+        """Whether this cars row can be rented from start_date to end_date (end excluded)"""
+        return self.availability.is_free(car.model, start_date, end_date, car.car_id)
+
+    def sync_availability(self):
+        """Set is_available to whether the car is free today by the AvailabilityIndex, for the cars
+        whose bookings changed and, on a new day, for every car. The flag only feeds the free pools
+        and the car search; it is worked out again on load, so it is not saved as a change."""
+        today = date.today()
+        if today != self.availability_day:
+            self.availability_day = today
+            cars = self.cars.rows
+        elif self.availability.touched:
+            cars = [car for key in self.availability.touched
+                    for car in (self.fleet.all_units(key[0]) if isinstance(key, tuple) else
+                                filter(None, [self.fleet.by_id.get(key)]))]
+        else:
+            return
+        self.availability.touched = set()
+        tomorrow = today + timedelta(days=1)
+        for car in list(cars):
+            flag = str(self.car_is_free(car, today, tomorrow))
+            if car.is_available != flag:
+                self.cars._set(car, {"is_available": flag})
+
+    def next_car_id(self):
+        """A car_id never used before, by a car or by a rental"""
+        return str(max(self.fleet.max_id, self.availability.max_car_id) + 1)
+
+    def insert_car(self, values):
+        """Insert a cars row, giving it the next car_id unless it has one"""
+        if not values.get("car_id"):
+            values = dict(values, car_id=self.next_car_id())
+        return self.cars.insert(values)
+
+    def number_cars(self):
+        """Give cars saved before cars had ids their row number as car_id. Every instance numbers the
+        same file the same way, and the ids are saved with the next rewrite of the cars."""
+        for car in self.cars.rows:
+            if not car.car_id:
+                car_id = str(car.rowid) if str(car.rowid) not in self.fleet.by_id else self.next_car_id()
+                self.cars._set(car, {"car_id": car_id}) # not a change to save on its own
+
+    def assign_old_rentals(self):
+        """Rentals saved before cars had ids only name the model. Those not over yet are given a
+        car of that model (one that is rented out first, for rentals that have started) so they hold
+        that car instead of every car of the model. Like number_cars this is the same in every
+        instance and is saved with the next rewrite of the rentals."""
+        today = date.today()
+        today_text = today.strftime("%Y-%m-%d")
+        for rental in self.rentals.rows:
+            if rental.car_id or (rental.end_date != "Ongoing" and rental.end_date <= today_text):
+                continue # the text check skips old history without parsing its dates
+            period = rental_period(rental)
+            if not period or period[1] <= today:
+                continue
+            cars = sorted(self.fleet.all_units(rental.car_model),
+                          key=lambda car: period[0] > today or car.is_available == "True")
+            car = next((car for car in cars if self.availability.car_is_free(car.car_id, *period)), None)
+            if car:
+                self.rentals._set(rental, {"car_id": car.car_id})
+
+    def find_user(self, username):
+        """users row with exactly this username (the first one if it is repeated)"""
+        return next((user for user in self.users.lookup("username", username) if user["username"] == username), None)
+
+    def find_users(self, username):
+        """Every users row with exactly this username (old files repeat some, with other passwords)"""
+        return [user for user in self.users.lookup("username", username) if user["username"] == username]
+
+    @timed("available cars")
+    def available_cars(self, start_date=None, end_date=None):
+        """Cars free today or, given a date range (end excluded), cars free for that whole range. The
+        list is cached until the cars or rentals change, so do not change it."""
+        return self.available_cache.get((start_date, end_date),
+                                        lambda: self._find_available_cars(start_date, end_date))
+
+    def _find_available_cars(self, start_date, end_date):
+        if start_date is None:
+            start_date = date.today()
+            end_date = start_date + timedelta(days=1)
+        # per model: its cars minus those booked then
+        found = []
+        for model, cars in self.fleet.units.items():
+            booked = self.availability.booked_cars(model, start_date, end_date)
+            if booked is not None:
+                found += [car for car_id, car in cars.items() if car_id not in booked]
+        found.sort(key=lambda car: car.rowid) # same order as the table
+        return found
+
+    def table(self, name):
+        return next(table for table in self.tables() if table.name == name)
+
+    @timed("load")
+    def load(self, progress=None):
+        """Read every table; progress(done, total, text) is called before each one if given"""
+        with self.lock, self.access:
+            self.backend.recover()
+            tables = self.tables()
+            for i, table in enumerate(tables):
+                if progress:
+                    progress(i, len(tables), f"Loading {table.name}...")
+                table.load(self.backend.load_rows(table))
+            self.number_cars()
+            self.assign_old_rentals()
+            for transaction in self.backend.committed_transactions():
+                self.redo(transaction)
+            self.number_cars() # rows inserted by an older version's redo log
+            self.assign_old_rentals()
+            self.availability_day = None
+            self.sync_availability()
+            self.version, self.checkpoints = self.lock.read()
+
+    def refresh(self):
+        """Catch up with changes committed by other instances (only called while holding the lock)"""
+        version, checkpoints = self.lock.read()
+        if version == self.version:
+            return
+        transactions = self.backend.read_new_transactions() if checkpoints == self.checkpoints else None
+        if transactions is None:
+            self.load() # files were rewritten by someone's checkpoint; our committed work is in them
+        else:
+            marks = {table.name: table.mark() for table in self.tables()}
+            for transaction in transactions:
+                self.redo(transaction)
+            if self.backend.stores_commits: # already stored by whoever committed them
+                for table in self.tables():
+                    del table.changes[marks[table.name][0]:]
+            self.version, self.checkpoints = version, checkpoints
+
+    def redo(self, transaction):
+        """Apply a committed transaction again after a crash (rows already on disk are skipped)"""
+        for name, operation, rowid, values in transaction:
+            table = self.table(name)
+            if operation == "insert":
+                if rowid >= table.next_rowid:
+                    table.changes.append(("insert", table._attach(values, rowid), None))
+                continue
+            row = table.get(rowid)
+            if row is None:
+                continue
+            if operation == "update":
+                table.update(row, values)
+            else:
+                table.delete([row])
+
+    @contextmanager
+    def transaction(self):
+        with self.lock: # another thread's transaction waits here, so the depth is only ever ours
+            if self.transaction_depth: # nested: becomes part of the outer transaction
+                self.transaction_depth += 1
+                try:
+                    yield self
+                finally:
+                    self.transaction_depth -= 1
+                return
+
+            with self.access:
+                self.refresh()
+                marks = {table.name: table.mark() for table in self.tables()}
+                self.transaction_depth = 1
+                try:
+                    yield self
+                except BaseException:
+                    for table in self.tables():
+                        table.rollback(marks[table.name])
+                    raise
+                finally:
+                    self.transaction_depth = 0
+                    self.sync_availability() # also after a rollback, which puts bookings back
+            # the changes are made; other threads may read them while the commit waits for the disk
+            entries = [(table, operation, row) for table in self.tables()
+                       for operation, row, before in table.changes[marks[table.name][0]:]]
+            if entries:
+                try:
+                    with metrics.timed("commit"):
+                        committed = self.backend.commit(entries)
+                except BaseException:
+                    with self.access:
+                        for table in self.tables():
+                            table.rollback(marks[table.name])
+                        self.sync_availability()
+                    raise
+                if committed:
+                    for table in self.tables():
+                        del table.changes[marks[table.name][0]:]
+                self.version += 1
+                self.lock.write(self.version, self.checkpoints)
+
+    @property
+    def dirty(self):
+        return any(table.dirty for table in self.tables())
+
+    @timed("flush")
+    def flush(self):
+        """Hand every table's pending changes to the storage backend. Tables only change while the
+        data lock is held, so the files are written without holding up readers (see access)."""
+        with self.lock:
+            with self.access:
+                self.refresh()
+            tables = [table for table in self.tables() if table.changes]
+            if tables:
+                rewritten = self.backend.flush(tables)
+                with self.access:
+                    for table in rewritten or (): # rows are numbered by their line in the new file
+                        table.renumber()
+                for table in tables:
+                    table.changes = []
+                self.version += 1
+                if not self.backend.stores_commits: # others cannot read these changes back one by one
+                    self.checkpoints += 1
+                self.lock.write(self.version, self.checkpoints)
+
+    def close(self):
+        self.backend.close()
+        self.lock.close()
+
+
+_repository = None
+_repository_lock = threading.Lock() # the GUI loads it on a worker thread
+
+
+def get_repository(progress=None):
+    """Shared repository used by the model classes and the GUI (loaded on first use)"""
+    global _repository
+    with _repository_lock:
+        if _repository is None:
+            repository = Repository()
+            repository.load(progress)
+            atexit.register(repository.flush) # pending changes are written when the program exits
+            _repository = repository
+    return _repository
 
 
 class Feedback(CSVStorable):
+    __slots__ = tuple(FEEDBACK_FIELDS)
+
     def __init__(self, username, car_model, feedback_text, timestamp):
         self.username = username
         self.car_model = car_model
@@ -48,18 +1936,79 @@ class Feedback(CSVStorable):
         self.timestamp = timestamp
 
     def save_to_csv(self):
-        feedbacks = read_csv(FEEDBACK_FILE) #reading csv file
-        fieldnames = ["username", "car_model", "feedback_text", "timestamp"]
-        feedbacks.append({
-            "username": self.username,
-            "car_model": self.car_model,
-            "feedback_text": self.feedback_text,
-            "timestamp": self.timestamp
-        })
-        write_csv(FEEDBACK_FILE, feedbacks, fieldnames)
+        repo = get_repository()
+        with repo.transaction():
+            repo.feedback.insert(self.as_row())
+
+
+def _scrypt(password, salt, cost, r, p):
+    return hashlib.scrypt(password.encode(), salt=salt, n=2 ** cost, r=r, p=p, maxmem=256 * r * 2 ** cost, dklen=32)
+
+
+def _password_scheme():
+    return "scrypt" if PASSWORD_HASH == "scrypt" and hasattr(hashlib, "scrypt") else "pbkdf2"
+
+
+@timed("hash password")
+def hash_password(password):
+    """Salted hash of password with the current scheme and cost, stored as
+    scrypt$cost$r$p$salt$hash or pbkdf2_sha256$iterations$salt$hash"""
+    salt = os.urandom(16)
+    if _password_scheme() == "scrypt":
+        return f"scrypt${SCRYPT_COST}$8$1${salt.hex()}${_scrypt(password, salt, SCRYPT_COST, 8, 1).hex()}"
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, PBKDF2_ITERATIONS)
+    return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${salt.hex()}${digest.hex()}"
+
+
+PASSWORD_HASH_FORMATS = {
+    "scrypt": re.compile(r"scrypt\$\d{1,2}\$\d{1,3}\$\d{1,3}\$(?:[0-9a-f]{2})+\$[0-9a-f]{64}"),
+    "pbkdf2_sha256": re.compile(r"pbkdf2_sha256\$\d{1,9}\$(?:[0-9a-f]{2})+\$[0-9a-f]{64}"),
+}
+
+
+def looks_like_password_hash(stored):
+    """Starts like a hash_password value (well-formed or not)"""
+    return (stored or "").split("$")[0] in PASSWORD_HASH_FORMATS
+
+
+def is_password_hash(stored):
+    """A well-formed hash_password value (any cost)"""
+    pattern = PASSWORD_HASH_FORMATS.get((stored or "").split("$")[0])
+    return pattern is not None and pattern.fullmatch(stored) is not None
+
+
+@timed("verify password")
+def verify_password(password, stored):
+    """Whether password matches the stored hash. Accounts saved before passwords were hashed
+    still hold the plaintext, which is compared as it is (see password_needs_rehash). A damaged
+    hash matches nothing."""
+    stored = stored or ""
+    if not looks_like_password_hash(stored):
+        return hmac.compare_digest(password.encode(), stored.encode())
+    if not is_password_hash(stored):
+        return False
+    parts = stored.split("$")
+    try:
+        if parts[0] == "scrypt":
+            digest = _scrypt(password, bytes.fromhex(parts[4]), int(parts[1]), int(parts[2]), int(parts[3]))
+        else:
+            digest = hashlib.pbkdf2_hmac("sha256", password.encode(), bytes.fromhex(parts[2]), int(parts[1]))
+    except (ValueError, OverflowError, MemoryError): # cost parameters scrypt/pbkdf2 refuse
+        return False
+    return hmac.compare_digest(digest.hex(), parts[-1])
+
+
+def password_needs_rehash(stored):
+    """True for plaintext and for hashes made with another scheme or cost than the current one"""
+    parts = (stored or "").split("$")
+    if _password_scheme() == "scrypt":
+        return parts[:4] != ["scrypt", str(SCRYPT_COST), "8", "1"]
+    return parts[:2] != ["pbkdf2_sha256", str(PBKDF2_ITERATIONS)]
 
 
 class User(CSVStorable):
+    __slots__ = tuple(USER_FIELDS)
+
     def __init__(self, username, password, first_name, last_name, address, balance, role="customer"): #instance attributes for customer while registering
         self.username = username
         self.password = password
@@ -70,69 +2019,43 @@ class User(CSVStorable):
         self.role = role
 
     def save_to_csv(self):
-        users = read_csv(USERS_FILE) #read csv file
-        fieldnames = ["username", "password", "first_name", "last_name", "address", "balance", "role"]
+        repo = get_repository()
 
         # Update existing user or add new user
-        user_found = False
-        for user in users:
-            if user["username"] == self.username:
-                user.update(self.__dict__)
-                user_found = True
-                break
-
-        if not user_found:
-            users.append(self.__dict__)
+        with repo.transaction():
+            user = User.find_row(self.username)
+            if user:
+                repo.users.update(user, self.as_row())
+            else:
+                repo.users.insert(self.as_row())
+
+    @staticmethod
+    def from_row(row, default_role="customer"):
+        return User(
+            row["username"],
+            row["password"],
+            row["first_name"],
+            row["last_name"],
+            row["address"],
+            row["balance"],
+            (row.get("role") or default_role).strip().lower()
+        )
 
-        write_csv(USERS_FILE, users, fieldnames)
+    @staticmethod
+    def find_row(username):
+        """users.csv row with exactly this username (the first one if it is repeated)"""
+        return get_repository().find_user(username)
 
     @staticmethod # Helps to call method directly on the class itself without needing any instance of it
     def authenticate(username, password):
-        # check fixed admin credentials
-        if username == FIXED_ADMIN_USERNAME and password == FIXED_ADMIN_PASSWORD:
-            users = read_csv(USERS_FILE)
-            admin_user = next((user for user in users if user["username"] == FIXED_ADMIN_USERNAME), None)
-
-            if admin_user:
-                return User(
-                    admin_user["username"],
-                    admin_user["password"],
-                    admin_user["first_name"],
-                    admin_user["last_name"],
-                    admin_user["address"],
-                    admin_user["balance"],
-                    admin_user.get("role", "admin").strip().lower()
-                )
-            else:
-                # Create admin user if not exists
-                admin_user = User(
-                    FIXED_ADMIN_USERNAME,
-                    FIXED_ADMIN_PASSWORD,
-                    "Admin", "User",
-                    "System", DEFAULT_ADMIN_BALANCE,
-                    "admin"
-                )
-                admin_user.save_to_csv()
-                return admin_user
-
-        # Check regular users
-        users = read_csv(USERS_FILE)
-        for user in users:
-            if user["username"] == username and user["password"] == password:
-                return User(
-                    user["username"],
-                    user["password"],
-                    user["first_name"],
-                    user["last_name"],
-                    user["address"],
-                    user["balance"],
-                    user.get("role", "customer").strip().lower()
-                )
-        return None
+        return RentalService().authenticate(username, password)
 
 
 class Car(CSVStorable):
-    def __init__(self, brand, model, seating_capacity, rental_price_per_day, is_available="True"):
+    __slots__ = tuple(CAR_FIELDS)
+
+    def __init__(self, brand, model, seating_capacity, rental_price_per_day, is_available="True", car_id=None):
+        self.car_id = car_id # given when the car is saved
         self.brand = brand
         self.model = model
         self.seating_capacity = int(seating_capacity)
@@ -140,33 +2063,1849 @@ class Car(CSVStorable):
         self.is_available = is_available
 
     def save_to_csv(self):
-        cars = read_csv(CARS_FILE)
-        fieldnames = ["brand", "model", "seating_capacity", "rental_price_per_day", "is_available"]
-        cars.append(self.__dict__)
-        write_csv(CARS_FILE, cars, fieldnames)
+        repo = get_repository()
+        with repo.transaction():
+            self.car_id = repo.insert_car(self.as_row()).car_id
 
     @staticmethod # Helps to call method directly on the class itself without needing any instance of it
-    def get_available_cars():
-        return [car for car in read_csv(CARS_FILE) if car["is_available"] == "True"]
+    def get_available_cars(start_date=None, end_date=None):
+        """Cars not rented out right now or, given a date range (end excluded), cars free for that whole range"""
+        return get_repository().available_cars(start_date, end_date)
 
 
 class Rental(CSVStorable): #Rental Class
-    def __init__(self, username, car_model, start_date, end_date, rent_amount): #Instance attributes for rental class
+    __slots__ = tuple(RENTAL_FIELDS)
+
+    def __init__(self, username, car_model, start_date, end_date, rent_amount, car_id=None): #Instance attributes for rental class
         self.username = username
         self.car_model = car_model
         self.start_date = start_date
         self.end_date = end_date
         self.rent_amount = float(rent_amount)
+        self.car_id = car_id
 
     def save_to_csv(self):
-        rentals = read_csv(RENTALS_FILE) #reads the csv file
-        fieldnames = ["username", "car_model", "start_date", "end_date", "rent_amount"]
-        rentals.append(self.__dict__)
-        write_csv(RENTALS_FILE, rentals, fieldnames)
+        repo = get_repository()
+        with repo.transaction():
+            repo.rentals.insert(self.as_row())
+
+
+def late_fee(rental, returned_at):
+    """Extra fee for a rental returned at returned_at (each day after the first costs the rent amount again)"""
+    expected_days = LATE_FEE_FREE_DAYS  # assume rental was for 1 day
+    rented_date = datetime.strptime(rental["start_date"], "%Y-%m-%d")
+    days_rented = (returned_at - rented_date).days
+
+    extra_fee = 0
+    if days_rented > expected_days:
+        extra_days = days_rented - expected_days
+        extra_fee = extra_days * float(rental["rent_amount"])
+    return extra_fee
+
+
+def _date_column(values):
+    """YYYY-MM-DD strings as a datetime64[D] array; anything unreadable becomes NaT"""
+    try:
+        return np.array(values, dtype="datetime64[D]")
+    except ValueError: # parse one by one only when some value is bad
+        column = np.empty(len(values), dtype="datetime64[D]")
+        for i, value in enumerate(values):
+            try:
+                column[i] = np.datetime64(value, "D")
+            except ValueError:
+                column[i] = np.datetime64("NaT")
+        return column
+
+
+class BatchBilling:
+    """Totals, overdue days and late fees for a whole set of rentals in one pass, with the same
+    rule as late_fee(): an ongoing rental pays its rent amount again for every day it has been out
+    beyond LATE_FEE_FREE_DAYS. With NumPy the rentals are loaded once into columns (datetime64
+    start dates, float64 amounts) and billed with vectorized arithmetic; without it the same
+    numbers are worked out row by row."""
+
+    def __init__(self, rentals):
+        self.rentals = list(rentals)
+        amounts = [r["rent_amount"] if isinstance(r["rent_amount"], float) else 0.0 for r in self.rentals]
+        ongoing = [r["end_date"] == "Ongoing" for r in self.rentals]
+        if np is not None:
+            self.engine = "numpy"
+            self.starts = _date_column([r["start_date"] for r in self.rentals])
+            self.amounts = np.array(amounts, dtype=np.float64)
+            self.ongoing = np.array(ongoing, dtype=bool) & ~np.isnat(self.starts)
+        else:
+            self.engine = "python"
+            parsed = {} # rentals share few distinct dates, so each one is parsed once
+            self.starts = [parsed[r["start_date"]] if r["start_date"] in parsed
+                           else parsed.setdefault(r["start_date"], self._parse(r["start_date"])) for r in self.rentals]
+            self.amounts = amounts
+            self.ongoing = [flag and start is not None for flag, start in zip(ongoing, self.starts)]
+
+    @staticmethod
+    def _parse(text):
+        try:
+            return datetime.strptime(text, "%Y-%m-%d").date()
+        except ValueError:
+            return None
+
+    def late_fees(self, as_of=None):
+        """(overdue days, late fee) for every rental as of that day (default today); 0 for rentals
+        that are not ongoing"""
+        as_of = as_of or date.today()
+        if self.engine == "numpy":
+            days_out = (np.datetime64(as_of, "D") - self.starts).astype(np.int64)
+            overdue = np.where(self.ongoing, np.maximum(days_out - LATE_FEE_FREE_DAYS, 0), 0)
+            return overdue, overdue * self.amounts
+        overdue = [max((as_of - start).days - LATE_FEE_FREE_DAYS, 0) if open_ else 0
+                   for start, open_ in zip(self.starts, self.ongoing)]
+        return overdue, [days * amount for days, amount in zip(overdue, self.amounts)]
+
+    def report(self, as_of=None):
+        overdue, fees = self.late_fees(as_of)
+        if self.engine == "numpy":
+            totals = self.amounts.sum(), self.ongoing.sum(), np.count_nonzero(overdue), fees.sum()
+        else:
+            totals = sum(self.amounts), sum(self.ongoing), sum(1 for days in overdue if days > 0), sum(fees)
+        billed, ongoing, overdue_count, late_fees = totals
+        return {"as_of": str(as_of or date.today()), "engine": self.engine, "rentals": len(self.rentals),
+                "billed": float(billed), "ongoing": int(ongoing), "overdue": int(overdue_count),
+                "late_fees": float(late_fees)}
+
+    def overdue(self, as_of=None):
+        """(rental, overdue days, late fee) for every overdue rental, highest late fee first"""
+        overdue, fees = self.late_fees(as_of)
+        if self.engine == "numpy":
+            found = np.flatnonzero(overdue > 0)
+            found = found[np.argsort(-fees[found], kind="stable")]
+        else:
+            found = sorted((i for i, days in enumerate(overdue) if days > 0), key=lambda i: -fees[i])
+        return [(self.rentals[i], int(overdue[i]), round(float(fees[i]), 2)) for i in found]
+
+    def overdue_rentals(self, as_of=None):
+        """One dict per overdue rental, highest late fee first"""
+        return [dict(rental, overdue_days=days, late_fee=fee) for rental, days, fee in self.overdue(as_of)]
+
+
+class ServiceError(Exception):
+    """A request refused by RentalService; the message is meant to be shown to the user as it is"""
+
+    def __init__(self, message, title="Error"):
+        super().__init__(message)
+        self.title = title
+
+
+class BookingError(ServiceError):
+    """A rental or return that cannot be carried out"""
+
+
+class BookingConflict(BookingError):
+    """The car was taken by another booking first"""
+
+
+class BookingEngine:
+    """Rents and returns cars, each as one locked transaction, so app instances sharing the data
+    directory can never book the same car twice. Whatever the caller saw before (e.g. the list of
+    available cars) is only a hint; it is checked again while holding the lock."""
+
+    def __init__(self, repository):
+        self.repository = repository
+
+    @timed("rent")
+    def rent(self, username, car_model, days, start_date=None, car_id=None):
+        """Book a car with exactly this model that is free for `days` days from start_date (default
+        today), or exactly the car car_id (e.g. the one quoted). Returns the new rental row."""
+        repo = self.repository
+        start_date = start_date or date.today()
+        end_date = start_date + timedelta(days=days)
+        with repo.transaction():
+            cars = [repo.fleet.by_id.get(car_id)] if car_id else repo.fleet.all_units(car_model)
+            car = next((car for car in cars if car is not None and car.model == car_model
+                        and repo.car_is_free(car, start_date, end_date)), None)
+            if car is None:
+                raise BookingConflict(f"{car_model} is not available from {start_date} to {end_date}.")
+
+            user = repo.find_user(username)
+            total_price = float(car["rental_price_per_day"]) * days
+            if user is not None and float(user["balance"]) < total_price:
+                raise BookingError(f"Insufficient balance. Total cost would be ${total_price:.2f}")
+
+            rental = repo.rentals.insert({
+                "username": username,
+                "car_model": car["model"],
+                "start_date": start_date.strftime("%Y-%m-%d"),
+                "end_date": end_date.strftime("%Y-%m-%d"),
+                "rent_amount": total_price,
+                "car_id": car.car_id
+            })
+            if user is not None:
+                repo.users.update(user, {"balance": float(user["balance"]) - total_price})
+        return rental
+
+    @timed("return")
+    def return_car(self, username, car_model):
+        """End the user's ongoing rental of car_model today, so its car is free again from today.
+        Only "Ongoing" rentals (kept open until returned) pay a late fee; one booked for a number of
+        days ends by itself and can be returned early. Returns (rental row, late fee charged)."""
+        repo = self.repository
+        with repo.transaction():
+            rental = next((r for r in repo.rentals.lookup("username", username)
+                           if r["username"] == username and rental_is_open(r)
+                           and r["car_model"].lower() == car_model.lower()), None)
+            if rental is None:
+                raise BookingError("Rental not found.")
+
+            current_date = datetime.now()
+            extra_fee = late_fee(rental, current_date) if rental["end_date"] == "Ongoing" else 0
+            repo.rentals.update(rental, {"end_date": current_date.strftime("%Y-%m-%d")})
+
+            for u in [u for u in repo.users.lookup("username", username) if u["username"] == username]:
+                repo.users.update(u, {"balance": float(u["balance"]) - extra_fee})
+        return rental, extra_fee
+
+
+PAYMENT_METHODS = ["credit card", "debit card", "cash"]
+CARD_PAYMENT_METHODS = ["credit card", "debit card"]
+
+
+def reads(method):
+    """Decorator for RentalService methods reading the tables or their indexes: they hold
+    Repository.access meanwhile. The GUI reads on the Tk thread while its storage worker makes
+    the changes, and the server reads on the event loop's executor while its writer does."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.repository.access:
+            self.repository.sync_availability() # a new day frees and takes cars without any change
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class RentalService:
+    """The car rental workflow without any user interface. Every method either does the job or
+    raises ServiceError, so the Tkinter app, other front-ends and load tests can share it."""
+
+    def __init__(self, repository=None):
+        self._repository = repository
+
+    @property
+    def repository(self):
+        return self._repository or get_repository()
+
+    # ---- accounts
+
+    @timed("authenticate")
+    def authenticate(self, username, password, rehash=True):
+        """The matching User, or None. The password is checked against the salted hash; if it was
+        saved in plaintext or with another cost it is hashed again with the current settings, unless
+        rehash is False (the caller then uses rehash_password). The fixed admin account is created
+        on its first login."""
+        if not username or not password:
+            return None
+        repo = self.repository
+        with repo.access: # only the lookup: the slow hash checks below must not hold up other threads
+            rows = repo.find_users(username)
+        if not rows:
+            if username != FIXED_ADMIN_USERNAME or password != FIXED_ADMIN_PASSWORD:
+                return None
+            admin_user = User(FIXED_ADMIN_USERNAME, hash_password(FIXED_ADMIN_PASSWORD), "Admin", "User",
+                              "System", DEFAULT_ADMIN_BALANCE, "admin")
+            with repo.transaction():
+                repo.users.insert(admin_user.as_row())
+            return admin_user
+
+        # a repeated username logs in with the password of any of its rows, as it always did
+        user = next((row for row in rows if verify_password(password, row.password)), None)
+        if user is None:
+            return None
+        if rehash and password_needs_rehash(user.password):
+            self.rehash_password(username, password, user.password)
+        return User.from_row(user, "admin" if username == FIXED_ADMIN_USERNAME else "customer")
+
+    def rehash_password(self, username, password, stored=None):
+        """Save an already checked password hashed with the current scheme and cost, in the row
+        whose saved password is `stored` (default: the row the password matches)"""
+        repo = self.repository
+        password_hash = hash_password(password) # the slow part, done before taking the lock
+        with repo.transaction():
+            for user in repo.find_users(username):
+                matches = user.password == stored if stored is not None else verify_password(password, user.password)
+                if matches and password_needs_rehash(user.password):
+                    repo.users.update(user, {"password": password_hash})
+                    break
+
+    def register(self, username, password, first_name, last_name, address, balance):
+        """Create a customer account and return it as a User"""
+        return self.add_user(self.new_user(username, password, first_name, last_name, address, balance))
+
+    def add_user(self, user):
+        """Save a User made by new_user, unless the username is taken"""
+        repo = self.repository
+        with repo.transaction():
+            if repo.users.lookup("username", user.username):
+                raise ServiceError("Username already exists!")
+            repo.users.insert(user.as_row())
+        return user
+
+    @staticmethod
+    def new_user(username, password, first_name, last_name, address, balance, keep_hash=False):
+        """A customer User built from these values after the registration checks. The password is
+        hashed, unless keep_hash is set and it is already a hash (an exported account); a damaged
+        hash is refused then, as nobody could log in with it."""
+        if not all([username, password, first_name, last_name, address, balance != ""]):
+            raise ServiceError("All fields are required!")
+        if username.lower() == FIXED_ADMIN_USERNAME.lower():
+            raise ServiceError("This username is reserved")
+        try:
+            balance = float(balance)
+            if balance < 0:
+                raise ValueError("Balance cannot be negative")
+        except (TypeError, ValueError) as e:
+            raise ServiceError(f"Invalid balance: {e}")
+        if keep_hash and looks_like_password_hash(password):
+            if not is_password_hash(password):
+                raise ServiceError("Invalid password hash")
+        else:
+            password = hash_password(password)
+        return User(username, password, first_name, last_name, address, balance, "customer")
+
+    @reads
+    def rental_history(self, username):
+        return [r for r in self.repository.rentals.lookup("username", username) if r["username"] == username]
+
+    @reads
+    def ongoing_rentals(self, username):
+        return [r for r in self.rental_history(username) if rental_is_open(r)]
+
+    # ---- fleet
+
+    @reads
+    def available_cars(self, start_date=None, end_date=None):
+        """Cached; see Repository.available_cars"""
+        return self.repository.available_cars(start_date, end_date)
+
+    @reads
+    def available_cars_cache_stats(self):
+        """Hits and misses of the available-cars cache"""
+        return self.repository.available_cache.stats()
+
+    @reads
+    def reserved_cars(self):
+        return [car for car in self.repository.cars.lookup("is_available", "False") if car.is_available == "False"]
+
+    @reads
+    def billing(self):
+        """BatchBilling over every rental"""
+        return BatchBilling(self.repository.rentals.rows)
+
+    def settle_overdue(self, as_of=None, log_file=None):
+        """Nightly settlement: close every overdue ongoing rental as of that day (default today),
+        charge its late fee and make its car available again. All of it is one transaction and one
+        flush, so each data file is written once; if the run is interrupted the transaction is
+        either replayed from the redo log or never happened, and running it again settles exactly
+        what is still open. Each run is logged as JSON lines to log_file (default settlement.log
+        in the data directory). Returns the summary."""
+        repo = self.repository
+        as_of = as_of or date.today()
+        log_file = log_file or os.path.join(repo.data_dir, SETTLEMENT_LOG_FILE)
+        run = {"run": datetime.now().isoformat(timespec="seconds"), "as_of": str(as_of)}
+
+        def log(record):
+            with open(log_file, "a") as file:
+                file.write(json.dumps(dict(run, **record)) + "\n")
+
+        log({"status": "started"})
+        with repo.transaction():
+            billing = BatchBilling([rental for rental in repo.rentals.rows if rental.end_date == "Ongoing"])
+            overdue = billing.overdue(as_of)
+            fees = Counter()
+            end_date = as_of.strftime("%Y-%m-%d")
+            for rental, days, fee in overdue:
+                repo.rentals.update(rental, {"end_date": end_date})
+                fees[rental.username] += fee
+            for username, fee in fees.items():
+                for user in [u for u in repo.users.lookup("username", username) if u.username == username]:
+                    repo.users.update(user, {"balance": float(user.balance) - fee})
+        repo.flush()
+
+        summary = {"status": "settled", "rentals": len(overdue), "customers": len(fees),
+                   "late_fees": round(sum(fees.values()), 2)}
+        log(dict(summary, settled=[[r.username, r.car_model, r.start_date, days, fee] for r, days, fee in overdue]))
+        return summary
+
+    @reads
+    def fleet_size(self, car_model):
+        return self.repository.fleet.counts(car_model)[1]
+
+    @timed("car search")
+    @reads
+    def search_cars(self, brand=None, min_seats=None, max_seats=None, min_price=None, max_price=None,
+                    sort="price", descending=False, offset=0, limit=CAR_SEARCH_PAGE):
+        """(number of models with a car available now that match, one page of them); see
+        CarSearchIndex.search. Seats and prices can be given as text from a form."""
+        if sort not in CAR_SEARCH_SORTS:
+            raise ServiceError(f"Cars can be sorted by {', '.join(CAR_SEARCH_SORTS)}.", "Input Error")
+        try:
+            min_seats, max_seats = [int(value) if value not in (None, "") else None for value in (min_seats, max_seats)]
+            min_price, max_price = [float(value) if value not in (None, "") else None for value in (min_price, max_price)]
+        except (TypeError, ValueError):
+            raise ServiceError("Seats must be whole numbers and prices numbers!", "Input Error")
+        return self.repository.car_search.search(brand, min_seats, max_seats, min_price, max_price, sort,
+                                                 descending, max(0, offset), limit)
+
+    @reads
+    def find_car(self, car_id):
+        """The cars row with this car_id, or None"""
+        return self.repository.fleet.by_id.get((car_id or "").strip())
+
+    def analytics(self):
+        """Running revenue and utilization totals (a RentalAnalytics). It changes with every
+        booking, so read it on the thread making the changes or use revenue_report."""
+        return self.repository.analytics
+
+    @reads
+    def revenue_report(self):
+        """The analytics totals as they are now: total revenue, rental count, and rows by model,
+        top customers and by day"""
+        analytics = self.repository.analytics
+        return {"total_revenue": analytics.total_revenue, "rental_count": analytics.rental_count,
+                "by_model": analytics.by_model(self.fleet_size), "top_customers": analytics.top_customers(),
+                "by_day": analytics.by_day()}
+
+    @reads
+    def all_rentals(self):
+        """Every rental (a copy of the row list, which other threads keep changing)"""
+        return list(self.repository.rentals.rows)
+
+    @reads
+    def all_feedback(self):
+        """Every feedback entry (a copy of the row list, which other threads keep changing)"""
+        return list(self.repository.feedback.rows)
+
+    def add_car(self, brand, model, seating_capacity, rental_price_per_day):
+        """Add a car to the fleet and return it"""
+        car = self.new_car(brand, model, seating_capacity, rental_price_per_day)
+        repo = self.repository
+        with repo.transaction():
+            car.car_id = repo.insert_car(car.as_row()).car_id
+        return car
+
+    @staticmethod
+    def new_car(brand, model, seating_capacity, rental_price_per_day):
+        """A Car built from these values after the add-car checks"""
+        if not all([brand, model, seating_capacity, rental_price_per_day]):
+            raise ServiceError("All fields are required!", "Input Error")
+        try:
+            price, seats = float(rental_price_per_day), int(seating_capacity)
+        except (TypeError, ValueError):
+            raise ServiceError("Seating capacity must be a whole number and rental price a number!", "Input Error")
+        if price <= 0 or not math.isfinite(price): # float() also takes "nan" and "inf"
+            raise ServiceError("Rental price must be positive!", "Input Error")
+        if seats <= 0:
+            raise ServiceError("Seating capacity must be at least 1!", "Input Error")
+        return Car(brand, model, seats, price)
+
+    def import_cars(self, file_path, progress=None):
+        """Add every car listed in a CSV or JSONL file (brand, model, seating_capacity,
+        rental_price_per_day and optionally car_id); see bulk_import. A fleet can have many cars
+        of one model, so a car_id that is already taken makes a duplicate; cars without one get the
+        next free id, unless the fleet already has as many cars with the same brand, model, seats
+        and price as the file lists."""
+        def build(values):
+            car = self.new_car(values.get("brand"), values.get("model"), values.get("seating_capacity"),
+                               values.get("rental_price_per_day"))
+            car.car_id = (values.get("car_id") or "").strip()
+            return car
+
+        def alike(car):
+            return (str(car["brand"]).casefold(), str(car["model"]).casefold(),
+                    int(float(car["seating_capacity"])), float(car["rental_price_per_day"]))
+        return self.bulk_import(file_path, self.repository.cars, "car_id", build,
+                                insert=self.repository.insert_car, progress=progress, alike=alike)
+
+    def import_users(self, file_path, progress=None):
+        """Add every customer listed in a CSV or JSONL file (the users.csv columns; role is
+        ignored, everyone imported is a customer). Plaintext passwords are hashed, which takes a
+        while at the default cost; exported password hashes are kept. See bulk_import."""
+        return self.bulk_import(file_path, self.repository.users, "username", lambda values: self.new_user(
+            values.get("username"), values.get("password"), values.get("first_name"), values.get("last_name"),
+            values.get("address"), values.get("balance", ""), keep_hash=True), exact=False, progress=progress)
+
+    def bulk_import(self, file_path, table, key, build, exact=True, insert=None, progress=None, alike=None):
+        """Stream the records of file_path through build(values), which raises ServiceError for a
+        bad one. A record whose key is already in the table or earlier in the file is a duplicate
+        (compared case-insensitively unless exact). Records with an empty key are compared with
+        alike(row) if given: one is a duplicate once the table already has as many rows alike as
+        the file has listed so far (so importing a file twice adds nothing the second time).
+        Nothing is written until the whole file has been
+        checked; the good records are then added in one transaction and one flush, so each data
+        file is rewritten once however many rows come in. progress(done, 0, text) is called every
+        IMPORT_PROGRESS_ROWS records if given. Records are added with insert (default table.insert).
+        Returns {"imported": n, "errors": [(row, message)]}."""
+        if not os.path.exists(file_path):
+            raise ServiceError(f"File not found: {file_path}", "Import Error")
+        same = (lambda a, b: a == b) if exact else (lambda a, b: a.casefold() == b.casefold())
+        seen, good, errors = set(), [], []
+        for count, (number, values) in enumerate(read_records(file_path), start=1):
+            if progress and count % IMPORT_PROGRESS_ROWS == 0:
+                progress(count, 0, f"Checked {count:,} rows...")
+            try:
+                if not isinstance(values, dict):
+                    raise ServiceError("Not a JSON object")
+                record = build(values)
+            except ServiceError as e:
+                errors.append((number, str(e)))
+                continue
+            name = getattr(record, key)
+            folded = name if exact else name.casefold()
+            if not name:
+                good.append((number, record))
+                continue
+            if folded in seen:
+                errors.append((number, f"Duplicate {key.replace('_', ' ')} {name} earlier in the file"))
+                continue
+            seen.add(folded)
+            good.append((number, record))
+
+        imported = 0
+        if good:
+            repo = self.repository
+            with repo.transaction(): # checked against the table under the lock, so other instances count too
+                existing = None # rows alike, counted on the first record without a key
+                listed = Counter()
+                for number, record in good:
+                    name = getattr(record, key)
+                    if name and any(same(row[key], name) for row in table.lookup(key, name)):
+                        errors.append((number, f"{key.replace('_', ' ').capitalize()} {name} already exists"))
+                        continue
+                    if not name and alike:
+                        if existing is None:
+                            existing = Counter(alike(row) for row in table.rows)
+                        similar = alike(record.as_row())
+                        listed[similar] += 1
+                        if listed[similar] <= existing[similar]:
+                            errors.append((number, f"Possible duplicate: {existing[similar]} alike already in "
+                                                   f"{table.name} (give it a {key.replace('_', ' ')} to add it anyway)"))
+                            continue
+                    (insert or table.insert)(record.as_row())
+                    imported += 1
+            repo.flush()
+        errors.sort()
+        return {"imported": imported, "errors": errors}
+
+    def export_cars(self, file_path):
+        """Write the fleet to a CSV or JSONL file; returns how many cars were written"""
+        with self.repository.access:
+            cars = list(self.repository.cars.rows)
+        return export_records(file_path, cars, CAR_FIELDS)
+
+    def export_users(self, file_path):
+        """Write every account to a CSV or JSONL file; returns how many were written"""
+        with self.repository.access:
+            users = list(self.repository.users.rows)
+        return export_records(file_path, users, USER_FIELDS)
+
+    def remove_car(self, model):
+        """Remove every car of this model; returns how many were removed"""
+        if not model:
+            raise ServiceError("Model name is required!", "Input Error")
+        repo = self.repository
+        with repo.transaction():
+            removed = repo.cars.delete(repo.cars.lookup("model", model))
+        if not removed:
+            raise ServiceError(f"No car found with model: {model}", "Not Found")
+        return removed
+
+    def remove_car_unit(self, car_id):
+        """Remove the one car with this car_id"""
+        repo = self.repository
+        with repo.transaction():
+            car = self.find_car(car_id)
+            if car is None:
+                raise ServiceError(f"No car found with ID: {car_id}", "Not Found")
+            repo.cars.delete([car])
+        return car
+
+    # ---- rentals
+
+    @reads
+    def quote(self, user, car_model, days, start_date=None):
+        """Check that the user can rent car_model for `days` days from start_date (default today).
+        Returns (car row, total price)."""
+        if not days or days <= 0:
+            raise ServiceError("Please enter a valid number of days.")
+        start_date = start_date or date.today()
+        if start_date < date.today():
+            raise ServiceError("The start date cannot be in the past.")
+        end_date = start_date + timedelta(days=days)
+
+        repo = self.repository
+        cars = repo.cars.lookup("model", car_model or "")
+        if not cars:
+            raise ServiceError("Car not found.")
+        car = next((car for car in cars if repo.car_is_free(car, start_date, end_date)), None)
+        if not car: # the car exists but has been taken (e.g. since the list of cars was shown)
+            raise BookingConflict(f"{car_model} is not available from {start_date} to {end_date}.")
+
+        rental_price = float(car["rental_price_per_day"])
+        if user.balance < rental_price:
+            raise ServiceError("Insufficient balance.")
+        total_price = rental_price * days
+        if user.balance < total_price:
+            raise ServiceError(f"Insufficient balance. Total cost would be ${total_price:.2f}")
+        return car, total_price
+
+    @staticmethod
+    def check_payment_method(payment_method):
+        if payment_method not in PAYMENT_METHODS:
+            raise ServiceError("Invalid payment method selected.", "Payment Error")
+
+    @staticmethod
+    def check_card(card_number, expiry_date, cvv):
+        if not card_number or len(card_number) != 16 or not card_number.isdigit():
+            raise ServiceError("Invalid card number.", "Payment Error")
+        if not expiry_date or len(expiry_date) != 5 or expiry_date[2] != '/':
+            raise ServiceError("Invalid expiry date format.", "Payment Error")
+        if not cvv or len(cvv) != 3 or not cvv.isdigit():
+            raise ServiceError("Invalid CVV.", "Payment Error")
+
+    def rent(self, user, car_model, days, payment_method, card_number=None, expiry_date=None, cvv=None,
+             start_date=None):
+        """Rent car_model for `days` days, paid by payment_method (card details are needed for card
+        payments). Charges the user and returns the new rental row."""
+        car, total_price = self.quote(user, car_model, days, start_date)
+        payment_method = (payment_method or "").lower()
+        self.check_payment_method(payment_method)
+        if payment_method in CARD_PAYMENT_METHODS:
+            self.check_card(card_number, expiry_date, cvv)
+
+        # Marks the car rented, creates the rental record and updates the balance in one locked
+        # transaction; fails if another app instance has rented the car in the meantime
+        rental = BookingEngine(self.repository).rent(user.username, car["model"], days, start_date, car.car_id)
+        self.update_balance(user)
+        return rental
+
+    def return_car(self, user, car_model):
+        """Close the user's ongoing rental of car_model. Returns (rental row, late fee charged)."""
+        if not self.ongoing_rentals(user.username):
+            raise ServiceError("No ongoing rentals to return.", "Return Car")
+        rental, extra_fee = BookingEngine(self.repository).return_car(user.username, car_model)
+        self.update_balance(user)
+        return rental, extra_fee
+
+    @reads
+    def update_balance(self, user):
+        """Set user.balance to the balance saved for the account"""
+        row = self.repository.find_user(user.username)
+        if row is not None:
+            user.balance = float(row["balance"])
+
+    @reads
+    def has_rented(self, username, car_model):
+        return any(r["car_model"].lower() == (car_model or "").lower() for r in self.rental_history(username))
+
+    def give_feedback(self, user, car_model, feedback_text):
+        """Store the user's feedback on a car model they have rented"""
+        if not self.rental_history(user.username):
+            raise ServiceError("You must rent a car before giving feedback.", "No Rentals")
+        if not self.has_rented(user.username, car_model):
+            raise ServiceError("You haven't rented this car model.")
+        if not feedback_text:
+            raise ServiceError("Feedback cannot be empty.")
+
+        fb = Feedback(user.username, car_model, feedback_text, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        repo = self.repository
+        with repo.transaction():
+            repo.feedback.insert(fb.as_row())
+        return fb
+
+    @timed("feedback search")
+    @reads
+    def search_feedback(self, keywords="", car_model=None, username=None, start_date=None, end_date=None,
+                        limit=FEEDBACK_SEARCH_LIMIT):
+        """(number of matches, best matches) from the feedback index; see FeedbackIndex.search"""
+        return self.repository.feedback_index.search(keywords, car_model, username, start_date, end_date, limit)
+
+    # ---- admin balance
+
+    @reads
+    def admin_balance(self):
+        admin_user = self.repository.find_user(FIXED_ADMIN_USERNAME)
+        return float(admin_user["balance"]) if admin_user else DEFAULT_ADMIN_BALANCE
+
+    def set_admin_balance(self, amount):
+        if amount is None or amount < 0:
+            raise ServiceError("The balance cannot be negative.")
+        repo = self.repository
+        with repo.transaction():
+            admin_user = repo.find_user(FIXED_ADMIN_USERNAME)
+            if admin_user:
+                repo.users.update(admin_user, {"balance": amount})
+            else:
+                # If admin not found in users.csv, create a new entry
+                repo.users.insert({
+                    "username": FIXED_ADMIN_USERNAME,
+                    "password": hash_password(FIXED_ADMIN_PASSWORD),
+                    "first_name": "Admin",
+                    "last_name": "User",
+                    "address": "System",
+                    "balance": amount,
+                    "role": "admin"
+                })
+
+
+def _stress_worker(data_dir, username, seed):
+    repo = Repository(data_dir)
+    repo.load()
+    engine = BookingEngine(repo)
+    rng = random.Random(seed)
+    booked = conflicts = 0
+    while True:
+        available = repo.cars.lookup("is_available", "True")
+        if not available:
+            with repo.lock:
+                repo.refresh()
+            available = repo.cars.lookup("is_available", "True")
+            if not available:
+                break
+        try:
+            engine.rent(username, rng.choice(available)["model"], 1)
+            booked += 1
+        except BookingConflict:
+            conflicts += 1
+    repo.flush()
+    repo.close()
+    return booked, conflicts
+
+
+def run_stress_test(processes=4, cars=500):
+    """Let several processes book the same fleet at once and check that no car was booked twice"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        repo = Repository(data_dir)
+        repo.load()
+        password_hash = hash_password("stress")
+        with repo.transaction():
+            for i in range(cars):
+                repo.insert_car({"brand": "Stress", "model": f"Car-{i:05d}", "seating_capacity": 4,
+                                  "rental_price_per_day": 10.0, "is_available": "True"})
+            for i in range(processes):
+                repo.users.insert({"username": f"stress{i}", "password": password_hash, "first_name": "Stress",
+                                   "last_name": str(i), "address": "Test", "balance": 1e9, "role": "customer"})
+        repo.flush()
+        repo.close()
+
+        started = time.perf_counter()
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.starmap(_stress_worker, [(data_dir, f"stress{i}", i) for i in range(processes)])
+        elapsed = time.perf_counter() - started
+
+        repo = Repository(data_dir)
+        repo.load()
+        repo.close()
+        bookings = Counter(r["car_id"] for r in repo.rentals)
+        double_booked = [model for model, count in bookings.items() if count > 1]
+        booked = sum(result[0] for result in results)
+        conflicts = sum(result[1] for result in results)
+
+        print(f"{processes} processes, {cars} cars: {booked} bookings in {elapsed:.2f}s "
+              f"({booked / elapsed:.0f} bookings/s), {conflicts} conflicts detected and refused")
+        print(f"rentals written: {len(repo.rentals)}, cars still available: "
+              f"{len(repo.cars.lookup('is_available', 'True'))}, double-booked cars: {len(double_booked)}")
+        return not double_booked and booked == len(repo.rentals) == cars
+
+
+def parse_date(text):
+    """YYYY-MM-DD text as a date (None stays None)"""
+    return datetime.strptime(text.strip(), "%Y-%m-%d").date() if text else None
+
+
+def user_json(user):
+    return {"username": user.username, "first_name": user.first_name, "last_name": user.last_name,
+            "role": user.role, "balance": user.balance}
+
+
+class SessionCache:
+    """Logged-in users by token, so a request after login costs a dict lookup instead of a password
+    check. Holds at most `size` sessions, dropping the least recently used first, and a session
+    expires `ttl` seconds after its last use."""
+
+    def __init__(self, size=SESSION_CACHE_SIZE, ttl=SESSION_TTL_SECONDS):
+        self.size = size
+        self.ttl = ttl
+        self.sessions = OrderedDict() # token -> (user, last used), least recently used first
+
+    def create(self, user):
+        token = os.urandom(16).hex()
+        self.sessions[token] = (user, time.monotonic())
+        while len(self.sessions) > self.size:
+            self.sessions.popitem(last=False)
+        return token
+
+    def get(self, token):
+        entry = self.sessions.get(token) if token else None
+        if entry is None:
+            return None
+        now = time.monotonic()
+        if now - entry[1] > self.ttl:
+            del self.sessions[token]
+            return None
+        self.sessions[token] = (entry[0], now)
+        self.sessions.move_to_end(token)
+        return entry[0]
+
+    def drop(self, token):
+        self.sessions.pop(token, None)
+
+    def __len__(self):
+        return len(self.sessions)
+
+
+class BookingServer:
+    """Serves RentalService as HTTP/JSON to many clients at once. Reads are answered from memory on
+    the loop's default executor. Every change is queued for a single writer task, which runs them one
+    after another on a worker thread, so the file lock and fsync never hold up the reads."""
+
+    def __init__(self, service=None, host="127.0.0.1", port=DEFAULT_SERVER_PORT):
+        self.service = service or RentalService()
+        self.host = host
+        self.port = port
+        self.sessions = SessionCache()  # token -> logged in User
+        self.writes = None  # queue of (function, args, future), made once the loop runs
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    async def write(self, function, *args):
+        """Run a mutation through the writer task and wait for its result"""
+        future = asyncio.get_running_loop().create_future()
+        await self.writes.put((function, args, future))
+        return await future
+
+    async def writer(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            function, args, future = await self.writes.get()
+            try:
+                result = await loop.run_in_executor(self.executor, function, *args)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+
+    async def flusher(self):
+        """Write-behind like the GUI: pending changes are flushed every FLUSH_INTERVAL_MS"""
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL_MS / 1000)
+            try:
+                await self.write(self.service.repository.flush)
+            except OSError as e:
+                print(f"Could not save data: {e}")
+
+    async def dispatch(self, method, path, params, token):
+        """(HTTP status, JSON result) for one request"""
+        service = self.service
+        user = self.sessions.get(token)
+        loop = asyncio.get_running_loop()
+        try:
+            if (method, path) == ("POST", "/register"):
+                # the checks and the slow password hash run on a thread, only saving it is a write
+                user = await loop.run_in_executor(None, service.new_user, params.get("username"),
+                                                  params.get("password"), params.get("first_name"),
+                                                  params.get("last_name"), params.get("address"),
+                                                  params.get("balance", ""))
+                return 201, user_json(await self.write(service.add_user, user))
+
+            if (method, path) == ("POST", "/login"):
+                username, password = params.get("username"), params.get("password")
+                if username == FIXED_ADMIN_USERNAME: # the first admin login creates the admin row
+                    user = await self.write(service.authenticate, username, password)
+                else:
+                    # hashing is slow on purpose, so it runs on a thread instead of holding up the loop;
+                    # a needed re-hash is a write and goes through the writer like every other change
+                    user = await loop.run_in_executor(None, service.authenticate, username, password, False)
+                    if user and password_needs_rehash(user.password):
+                        await self.write(service.rehash_password, username, password, user.password)
+                if user is None:
+                    return 401, {"error": "Invalid username or password"}
+                return 200, dict(user_json(user), token=self.sessions.create(user))
+
+            if (method, path) == ("POST", "/logout"):
+                self.sessions.drop(token)
+                return 200, {"logged_out": user is not None}
+
+            if (method, path) == ("GET", "/cars"):
+                start_date = parse_date(params.get("start_date"))
+                end_date = start_date + timedelta(days=int(params.get("days", 1))) if start_date else None
+                return 200, await loop.run_in_executor(None, service.available_cars, start_date, end_date)
+
+            if path in ("/rent", "/return", "/history") and user is None:
+                return 401, {"error": "Please log in first."}
+
+            if (method, path) == ("POST", "/rent"):
+                rental = await self.write(service.rent, user, params.get("car_model"), int(params.get("days", 0)),
+                                          params.get("payment_method"), params.get("card_number"),
+                                          params.get("expiry_date"), params.get("cvv"),
+                                          parse_date(params.get("start_date")))
+                return 201, dict(rental, balance=user.balance)
+
+            if (method, path) == ("POST", "/return"):
+                rental, extra_fee = await self.write(service.return_car, user, params.get("car_model"))
+                return 200, dict(rental, extra_fee=extra_fee, balance=user.balance)
+
+            if (method, path) == ("GET", "/history"):
+                return 200, await loop.run_in_executor(None, service.rental_history, user.username)
+
+            return 404, {"error": f"No such endpoint: {method} {path}"}
+        except BookingConflict as e:
+            return 409, {"error": str(e), "title": e.title}
+        except ServiceError as e:
+            return 400, {"error": str(e), "title": e.title}
+        except (ValueError, TypeError) as e:
+            return 400, {"error": f"Invalid request: {e}"}
+
+    async def handle(self, reader, writer):
+        """One client connection; HTTP/1.1 keep-alive is supported so clients can reuse it"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                url = urlsplit(target)
+                params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+                token = headers.get("authorization", "").replace("Bearer ", "", 1) or None
+                try:
+                    data = json.loads(body) if body else {}
+                except ValueError:
+                    data = None
+                if isinstance(data, dict): # valid JSON can still be a list, string or number
+                    params.update(data)
+                    status, result = await self.dispatch(method.upper(), url.path, params, token)
+                else:
+                    status, result = 400, {"error": "The request body must be a JSON object."}
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                payload = json.dumps(result, default=dict).encode() # table rows are mappings, not dicts
+                writer.write(f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                             f"Content-Type: application/json\r\n"
+                             f"Content-Length: {len(payload)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass # client went away or sent something that is not HTTP
+        finally:
+            writer.close()
+
+    async def serve(self):
+        self.writes = asyncio.Queue()
+        tasks = [asyncio.create_task(self.writer()), asyncio.create_task(self.flusher())]
+        server = await asyncio.start_server(self.handle, self.host, self.port)
+        if os.name == "posix": # stop cleanly (and flush) when terminated
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        print(f"Serving the car rental API on http://{self.host}:{self.port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.executor.shutdown(wait=True)
+            self.service.repository.flush()
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[round(fraction * (len(values) - 1))] if values else 0.0
+
+
+async def _load_client(host, port, name, requests, latencies, statuses):
+    """One simulated customer: registers, logs in, then browses, rents and checks its history"""
+    reader, writer = await asyncio.open_connection(host, port)
+    rng = random.Random(name)
+
+    async def call(method, path, body=None, token=None):
+        payload = json.dumps(body).encode() if body is not None else b""
+        head = (f"{method} {path} HTTP/1.1\r\nHost: {host}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n")
+        if token:
+            head += f"Authorization: Bearer {token}\r\n"
+        started = time.perf_counter()
+        writer.write((head + "\r\n").encode() + payload)
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            header, _, value = line.decode("latin-1").partition(":")
+            if header.lower() == "content-length":
+                length = int(value)
+        result = json.loads(await reader.readexactly(length))
+        latencies.setdefault(f"{method} {path.split('?')[0]}", []).append(time.perf_counter() - started)
+        statuses[status] += 1
+        return status, result
+
+    try:
+        await call("POST", "/register", {"username": name, "password": "load", "first_name": "Load",
+                                         "last_name": "Test", "address": "localhost", "balance": 1e9})
+        status, session = await call("POST", "/login", {"username": name, "password": "load"})
+        if status != 200:
+            return
+        token = session["token"]
+        for _ in range(requests):
+            status, cars = await call("GET", "/cars")
+            if cars:
+                await call("POST", "/rent", {"car_model": rng.choice(cars)["model"], "days": 1,
+                                             "payment_method": "cash"}, token)
+            await call("GET", "/history", token=token)
+    finally:
+        writer.close()
+
+
+async def _load_test(url, clients, requests):
+    url = urlsplit(url if "//" in url else f"http://{url}")
+    latencies = {}
+    statuses = Counter()
+    prefix = f"load{os.getpid()}-"
+    started = time.perf_counter()
+    await asyncio.gather(*(_load_client(url.hostname, url.port or 80, f"{prefix}{i}", requests, latencies, statuses)
+                           for i in range(clients)))
+    return latencies, statuses, time.perf_counter() - started
+
+
+def run_load_test(url, clients=20, requests=50):
+    """Drive a --serve instance with many concurrent clients and print p50/p99 latency per endpoint"""
+    latencies, statuses, elapsed = asyncio.run(_load_test(url, clients, requests))
+    total = sum(len(values) for values in latencies.values())
+    print(f"{clients} clients, {total} requests in {elapsed:.2f}s ({total / elapsed:.0f} requests/s)")
+    print(f"{'endpoint':<16}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    for endpoint, values in sorted(latencies.items()):
+        print(f"{endpoint:<16}{len(values):>8}{percentile(values, 0.5) * 1000:>10.2f}"
+              f"{percentile(values, 0.99) * 1000:>10.2f}")
+    every = [value for values in latencies.values() for value in values]
+    print(f"{'all':<16}{len(every):>8}{percentile(every, 0.5) * 1000:>10.2f}{percentile(every, 0.99) * 1000:>10.2f}")
+    print("status codes: " + ", ".join(f"{code}: {count}" for code, count in sorted(statuses.items())))
+    return total > 0
+
+
+BENCHMARK_BRANDS = ["Toyota", "Honda", "Ford", "BMW", "Kia", "Hyundai", "Tesla", "Suzuki"]
+BENCHMARK_FEEDBACK = ["Clean car and friendly staff, would rent again.", "The brakes were noisy and the AC was weak.",
+                      "Great value for the price.", "Pickup took forever, the staff were rude.",
+                      "Smooth ride, very comfortable seats.", "Car was dirty inside and smelled of smoke.",
+                      "Fuel tank was empty at pickup.", "Friendly service, quick return, no hidden fees."]
+BENCHMARK_SIZES = [1000, 10000, 100000]  # --benchmark default; pass --bench-sizes up to 10000000 for the big runs
+
+
+def generate_dataset(data_dir, rows, seed=0):
+    """Write synthetic users, cars, rentals and feedback CSV files with `rows` rows each. Rows are
+    streamed to the files, so even the 10M-row datasets take little memory to create.
+    Every 100th car (Model-0, Model-100, ...) is out on an ongoing rental by user0, user100, ...
+    Car Model-i has car_id i + 1."""
+    rng = random.Random(seed)
+    today = date.today()
+
+    def write(name, records):
+        with open(os.path.join(data_dir, TABLE_FILES[name]), mode='w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(TABLE_FIELDS[name])
+            writer.writerows(records)
+
+    def rentals():
+        for i in range(rows):
+            if i % 100 == 0:
+                yield f"user{i}", f"Model-{i}", (today - timedelta(days=2)).isoformat(), "Ongoing", 100.0, i + 1
+            else:
+                start = today - timedelta(days=rng.randint(30, 1000))
+                days = rng.randint(1, 14)
+                car = rng.randrange(rows)
+                yield (f"user{rng.randrange(rows)}", f"Model-{car}", start.isoformat(),
+                       (start + timedelta(days=days)).isoformat(), days * 50.0, car + 1)
+
+    password_hash = hash_password("secret") # one hash for everyone: hashing millions of passwords takes hours
+    write("users", ((f"user{i}", password_hash, "First", f"Last{i}", f"{i} Main Street", 1e6, "customer")
+                    for i in range(rows)))
+    write("cars", ((i + 1, rng.choice(BENCHMARK_BRANDS), f"Model-{i}", rng.choice((2, 4, 5, 7)), rng.randint(20, 300),
+                    "False" if i % 100 == 0 else "True") for i in range(rows)))
+    write("rentals", rentals())
+    write("feedback", ((f"user{rng.randrange(rows)}", f"Model-{rng.randrange(rows)}", rng.choice(BENCHMARK_FEEDBACK),
+                        f"{today - timedelta(days=rng.randrange(365))} 12:00:00")
+                       for i in range(rows)))
+
+
+def _timed(results, rows, operation, function, ops=1):
+    """Run function once, record how long it took and print it"""
+    started = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - started
+    result = {"rows": rows, "operation": operation, "ops": ops, "seconds": seconds, "us_per_op": seconds / ops * 1e6}
+    results.append(result)
+    print(f"{rows:>10} rows  {operation:<30}{seconds:>10.4f}s {result['us_per_op']:>14.1f} us/op")
+
+
+def run_login_benchmark(clients=20, logins=200, target=LOGIN_TARGET_PER_SECOND):
+    """Log in from `clients` threads at once at the current password hashing cost and print the
+    login rate and p50/p99, then time session lookups (what every request after login costs).
+    Returns whether the login rate reaches target logins per second."""
+    with tempfile.TemporaryDirectory() as data_dir:
+        repo = Repository(data_dir)
+        repo.load()
+        password_hash = hash_password("secret")
+        with repo.transaction():
+            for i in range(clients):
+                repo.users.insert({"username": f"login{i}", "password": password_hash, "first_name": "Login",
+                                   "last_name": str(i), "address": "Test", "balance": 0.0, "role": "customer"})
+        service = RentalService(repo)
+        latencies = []
+
+        def login(i):
+            started = time.perf_counter()
+            user = service.authenticate(f"login{i % clients}", "secret", rehash=False)
+            latencies.append(time.perf_counter() - started)
+            return user is not None
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            all_ok = all(pool.map(login, range(logins)))
+        elapsed = time.perf_counter() - started
+
+        sessions = SessionCache()
+        tokens = [sessions.create(service.authenticate(f"login{i}", "secret")) for i in range(min(clients, 5))]
+        lookups = logins * 1000
+        lookup_started = time.perf_counter()
+        for i in range(lookups):
+            sessions.get(tokens[i % len(tokens)])
+        lookup_seconds = time.perf_counter() - lookup_started
+        repo.close()
+
+    rate = logins / elapsed
+    cost = f"n=2**{SCRYPT_COST}" if _password_scheme() == "scrypt" else f"{PBKDF2_ITERATIONS} iterations"
+    print(f"{_password_scheme()} ({cost}): {logins} logins from {clients} threads in {elapsed:.2f}s "
+          f"({rate:.1f} logins/s, target {target}/s)")
+    print(f"login p50 {percentile(latencies, 0.5) * 1000:.1f} ms, p99 {percentile(latencies, 0.99) * 1000:.1f} ms")
+    print(f"session lookup {lookup_seconds / lookups * 1e6:.2f} us")
+    return all_ok and rate >= target
+
+
+def run_benchmark(sizes=BENCHMARK_SIZES, samples=200):
+    """Time the CSV persistence and lookup paths on synthetic datasets of each size. Returns the results."""
+    results = []
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as data_dir:
+            print(f"generating {rows} rows per table ...")
+            generate_dataset(data_dir, rows)
+            records = []
+            users_file = os.path.join(data_dir, USERS_FILE)
+            _timed(results, rows, "read_csv users", lambda: records.extend(read_csv(users_file)))
+            _timed(results, rows, "write_csv users", lambda: write_csv(users_file, records, USER_FIELDS))
+            records.clear()
+            cars_file = os.path.join(data_dir, CARS_FILE)
+            _timed(results, rows, "scan_csv available cars",
+                   lambda: sum(1 for _ in scan_csv(cars_file, ["model"], {"is_available": "True"})))
+            last_user = f"user{rows - 1}"
+            _timed(results, rows, "first_csv_row first user",
+                   lambda: first_csv_row(users_file, ["username", "password"], {"username": "user0"}))
+            _timed(results, rows, "first_csv_row last user",
+                   lambda: first_csv_row(users_file, ["username", "password"], {"username": last_user}))
+
+            if STORAGE_BACKEND == "sqlite":
+                backend = SQLiteBackend(os.path.join(data_dir, SQLITE_FILE))
+                _timed(results, rows, "sqlite import_csv", lambda: backend.import_csv(data_dir))
+                backend.close()
+
+            repo = Repository(data_dir)
+            _timed(results, rows, "repository load", repo.load)
+            service = RentalService(repo)
+            rng = random.Random(rows)
+
+            usernames = [f"user{rng.randrange(rows)}" for _ in range(20)] # each login is a deliberately slow hash
+            _timed(results, rows, "authenticate",
+                   lambda: [service.authenticate(username, "secret") for username in usernames], len(usernames))
+            # the uncached search, then the cached list the service hands out until the cars or rentals change
+            _timed(results, rows, "available cars (now)",
+                   lambda: [repo._find_available_cars(None, None) for _ in range(5)], 5)
+            start_date = date.today() + timedelta(days=7)
+            _timed(results, rows, "available cars (date range)",
+                   lambda: [repo._find_available_cars(start_date, start_date + timedelta(days=3)) for _ in range(5)], 5)
+            service.available_cars()
+            _timed(results, rows, "available cars (cached)", lambda: [service.available_cars() for _ in range(samples)],
+                   samples)
+
+            engine = BookingEngine(repo)
+            available = service.available_cars()
+            models = [car["model"] for car in rng.sample(available, min(samples, len(available)))]
+            _timed(results, rows, "rent", lambda: [engine.rent("user1", model, 1) for model in models], len(models))
+            ongoing = [(f"user{i}", f"Model-{i}") for i in range(0, rows, 100)][:samples]
+            _timed(results, rows, "return",
+                   lambda: [engine.return_car(username, model) for username, model in ongoing], len(ongoing))
+            _timed(results, rows, "batch billing", lambda: service.billing().report())
+            _timed(results, rows, "feedback search (keywords)",
+                   lambda: [service.search_feedback("staff rude") for _ in range(5)], 5)
+            _timed(results, rows, "feedback search (model + dates)",
+                   lambda: [service.search_feedback("", "Model-1", None, date.today() - timedelta(days=30), date.today())
+                            for _ in range(5)], 5)
+            _timed(results, rows, "car search (brand, by price)",
+                   lambda: [service.search_cars("Toyota") for _ in range(samples)], samples)
+            _timed(results, rows, "car search (seats+price, name)",
+                   lambda: [service.search_cars(None, 4, 5, 50, 150, "name", offset=100) for _ in range(samples)],
+                   samples)
+            _timed(results, rows, "flush (checkpoint)", repo.flush)
+            repo.close()
+    return results
+
+
+def compare_benchmarks(baseline_file, results, tolerance=1.25):
+    """Print each operation's speed against an earlier results file; returns the ones that got
+    slower by more than `tolerance` times"""
+    with open(baseline_file) as file:
+        baseline = {(r["rows"], r["operation"]): r["us_per_op"] for r in json.load(file)["results"]}
+    regressions = []
+    for result in results:
+        before = baseline.get((result["rows"], result["operation"]))
+        if not before:
+            continue
+        ratio = result["us_per_op"] / before
+        slower = ratio > tolerance
+        if slower:
+            regressions.append(result)
+        print(f"{result['rows']:>10} rows  {result['operation']:<30}{ratio:>8.2f}x {'REGRESSION' if slower else ''}")
+    return regressions
+
+
+def save_benchmark(output_file, results):
+    report = {"created": datetime.now().isoformat(timespec="seconds"), "backend": STORAGE_BACKEND,
+              "python": platform.python_version(), "platform": platform.platform(), "results": results}
+    with open(output_file, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"results written to {output_file}")
+
+
+class SessionProfiler:
+    """Profiles a whole GUI session for --profile and times every button and background task"""
+
+    def __init__(self, output_file, mode="cprofile", top=PROFILE_TOP, interval=PROFILE_SAMPLE_INTERVAL):
+        self.output_file = output_file
+        self.summary_file = os.path.splitext(output_file)[0] + "-summary.txt"
+        self.mode = mode
+        self.top = top
+        self.interval = interval
+        self.handlers = {} # button label -> [calls, total seconds, slowest]
+        self.tasks = {} # background task label -> [calls, total seconds, slowest]
+        self.stacks = Counter() # sampled stacks, outermost function first
+        self.profile = None
+        self.task_profiles = [] # one cProfile.Profile per background task
+        self.busy_threads = set() # worker threads running a task right now (idle ones are not sampled)
+        self.lock = threading.Lock() # tasks finish on the worker threads
+        self.sampler = None
+        self.running = False
+        self.original_button_init = None
+        self.original_submit = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.running = True
+        self.original_button_init = tk.Button.__init__
+        profiler = self
+
+        def button_init(button, master=None, cnf={}, **kw):
+            if callable(kw.get("command")):
+                kw["command"] = profiler.timed_command(kw["command"], kw.get("text"))
+            profiler.original_button_init(button, master, cnf, **kw)
+
+        tk.Button.__init__ = button_init
+        self.original_submit = BackgroundTasks.submit
+
+        def submit(tasks, function, *args, **kw):
+            task = profiler.original_submit(tasks, profiler.profiled_task(function), *args, **kw)
+            task.future.add_done_callback(profiler.task_timer(profiler.label(function), time.perf_counter()))
+            return task
+
+        BackgroundTasks.submit = submit
+        if self.mode == "sample":
+            self.sampler = threading.Thread(target=self.sample, args=(threading.get_ident(),),
+                                            name="profiler", daemon=True)
+            self.sampler.start()
+        else:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    @staticmethod
+    def label(function, text=None):
+        """e.g. "CarRentalApp: Rent a Car" for a button, "RentalService: rent_car" for a task"""
+        owner = type(function.__self__).__name__ if hasattr(function, "__self__") else getattr(function, "__qualname__", "").split(".")[0]
+        name = text or getattr(function, "__name__", type(function).__name__)
+        return f"{owner}: {name}" if owner and owner != name else name
+
+    @staticmethod
+    def record(timings, label, seconds):
+        stats = timings.setdefault(label, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += seconds
+        stats[2] = max(stats[2], seconds)
+
+    def timed_command(self, command, text):
+        """command, recording its wall time under the button's window class and text"""
+        label = self.label(command, text)
+
+        def timed_call(*args):
+            started = time.perf_counter()
+            try:
+                return command(*args)
+            finally:
+                self.record(self.handlers, label, time.perf_counter() - started)
+        return timed_call
+
+    def task_timer(self, label, submitted):
+        """Done callback for a task's future: records the time from submit until it is done"""
+        def done(future):
+            with self.lock:
+                self.record(self.tasks, label, time.perf_counter() - submitted)
+        return done
+
+    def profiled_task(self, function):
+        """function, run under its own cProfile (or marked as busy for the sampler) on the worker"""
+        def run(*args, **kw):
+            thread_id = threading.get_ident()
+            with self.lock:
+                self.busy_threads.add(thread_id)
+            profile = None
+            if self.mode != "sample":
+                profile = cProfile.Profile()
+                try:
+                    profile.enable()
+                except ValueError: # Python 3.12+: only one profiler at a time, and the main one already sees every thread
+                    profile = None
+            try:
+                return function(*args, **kw)
+            finally:
+                if profile is not None:
+                    profile.disable()
+                with self.lock:
+                    self.busy_threads.discard(thread_id)
+                    if profile is not None:
+                        self.task_profiles.append(profile)
+        return run
+
+    def sample(self, thread_id):
+        names = {}
+        while self.running:
+            with self.lock:
+                thread_ids = [thread_id] + list(self.busy_threads)
+            frames = sys._current_frames()
+            for ident in thread_ids:
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if stack:
+                    if ident != thread_id: # worker stacks start with the thread's name, e.g. storage_0
+                        if ident not in names:
+                            names.update((thread.ident, thread.name) for thread in threading.enumerate())
+                        stack.append(names.get(ident, "worker"))
+                    self.stacks[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+    def stop(self):
+        """Stop profiling, write the profile and the summary; returns the summary"""
+        self.running = False
+        tk.Button.__init__ = self.original_button_init
+        BackgroundTasks.submit = self.original_submit
+        seconds = time.perf_counter() - self.started
+        if self.profile is not None:
+            self.profile.disable()
+            self.stats().dump_stats(self.output_file)
+        else:
+            self.sampler.join()
+            with open(self.output_file, mode='w') as file:
+                file.writelines(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+        summary = self.summary(seconds)
+        with open(self.summary_file, mode='w') as file:
+            file.write(summary)
+        return summary
+
+    def stats(self, stream=None):
+        """The Tk thread's profile with every background task's added in"""
+        stats = pstats.Stats(self.profile, stream=stream)
+        with self.lock:
+            if self.task_profiles:
+                stats.add(*self.task_profiles)
+        return stats
+
+    def summary(self, seconds):
+        lines = [f"Session: {seconds:.1f} s, profile written to {self.output_file}",
+                 "(time spent in Tk's mainloop itself is the app waiting for the user)", ""]
+        if self.profile is not None:
+            text = io.StringIO()
+            self.stats(text).sort_stats("tottime").print_stats(self.top)
+            lines.append(text.getvalue().strip())
+        else:
+            total = sum(self.stacks.values()) or 1
+            own, overall = Counter(), Counter()
+            for stack, count in self.stacks.items():
+                functions = stack.split(";")
+                own[functions[-1]] += count
+                for function in set(functions): # a recursive function counts once per sample
+                    overall[function] += count
+            lines += [f"{total:,} samples every {self.interval * 1000:g} ms, hottest first", "",
+                      f"{'own %':>7} {'total %':>8}  function"]
+            lines += [f"{count / total:>7.1%} {overall[function] / total:>8.1%}  {function}"
+                      for function, count in own.most_common(self.top)]
+        lines += ["", "Buttons (wall time, dialogs they open included)", "",
+                  f"{'calls':>6} {'total s':>9} {'mean ms':>9} {'max ms':>9}  button"]
+        lines += [f"{calls:>6} {total:>9.3f} {total / calls * 1000:>9.1f} {slowest * 1000:>9.1f}  {label}"
+                  for label, (calls, total, slowest) in sorted(self.handlers.items(), key=lambda item: -item[1][1])]
+        if not self.handlers:
+            lines.append("(no buttons were pressed)")
+        lines += ["", "Background tasks (wall time from being submitted until done, waiting in the queue included)", "",
+                  f"{'calls':>6} {'total s':>9} {'mean ms':>9} {'max ms':>9}  task"]
+        with self.lock:
+            tasks = sorted(self.tasks.items(), key=lambda item: -item[1][1])
+        lines += [f"{calls:>6} {total:>9.3f} {total / calls * 1000:>9.1f} {slowest * 1000:>9.1f}  {label}"
+                  for label, (calls, total, slowest) in tasks]
+        if not tasks:
+            lines.append("(no background tasks were run)")
+        return "\n".join(lines) + "\n"
+
+
+class TaskCancelled(Exception):
+    """Raised inside a background task once it has been cancelled"""
+
+
+class BackgroundTask:
+    """Handle for work given to BackgroundTasks. Long work reports progress between steps;
+    progress() raises TaskCancelled there once cancel() has been called."""
+
+    def __init__(self, tasks):
+        self.tasks = tasks
+        self.cancelled = threading.Event()
+        self.future = None
+        self.on_progress = None # called on the Tk thread with (done, total, text)
+
+    def progress(self, done, total, text=""):
+        if self.cancelled.is_set():
+            raise TaskCancelled()
+        if self.on_progress:
+            self.tasks.call_soon(self.on_progress, done, total, text)
+
+    def cancel(self):
+        self.cancelled.set()
+        if self.future:
+            self.future.cancel() # only stops it if it has not started yet
+
+    def running(self):
+        return self.future is not None and not self.future.done()
+
+
+class BackgroundTasks:
+    """Runs storage work on a thread pool so the Tk main loop never waits for the disk. Tk may only
+    be used from its own thread, so results are queued and handed to the callbacks by a root.after
+    poll. One worker by default: the repository then sees its changes one at a time, in order."""
+
+    def __init__(self, root, workers=1, poll_ms=50):
+        self.root = root
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="storage")
+        self.callbacks = queue.SimpleQueue()
+        self.poll_ms = poll_ms
+        self.root.after(poll_ms, self.poll)
+
+    def call_soon(self, callback, *args):
+        """Run callback on the Tk thread"""
+        self.callbacks.put((callback, args))
+
+    def poll(self):
+        while True:
+            try:
+                callback, args = self.callbacks.get_nowait()
+            except queue.Empty:
+                break
+            callback(*args)
+        self.root.after(self.poll_ms, self.poll)
+
+    def submit(self, function, *args, on_done=None, on_error=None, on_cancel=None, title=None,
+               report_progress=False):
+        """Run function(*args) in the background. on_done(result) or on_error(exception) is then
+        called on the Tk thread; without on_error the error is shown in a message box. With a title
+        a progress window with a Cancel button is shown meanwhile, and with report_progress the
+        function is also given progress=task.progress to drive its bar. If it is cancelled,
+        on_cancel() is called instead (if given)."""
+        task = BackgroundTask(self)
+        dialog = ProgressDialog(self.root, title, task) if title else None
+        if dialog:
+            task.on_progress = dialog.update_progress
+
+        def finished(error, result):
+            if dialog:
+                dialog.close()
+            if task.cancelled.is_set():
+                if on_cancel:
+                    on_cancel()
+                return
+            if error is None:
+                if on_done:
+                    on_done(result)
+            elif on_error:
+                on_error(error)
+            else:
+                messagebox.showerror(getattr(error, "title", "Error"), str(error))
+
+        def run():
+            try:
+                result = function(*args, progress=task.progress) if report_progress else function(*args)
+            except TaskCancelled:
+                self.call_soon(finished, None, None)
+            except Exception as e:
+                self.call_soon(finished, e, None)
+            else:
+                self.call_soon(finished, None, result)
+
+        task.future = self.executor.submit(run)
+        # cancelled before it started: run() never reports, so report here
+        task.future.add_done_callback(lambda future: future.cancelled() and self.call_soon(finished, None, None))
+        return task
+
+
+class ProgressDialog:
+    """Small window with a progress bar and a Cancel button, shown while a long task runs"""
+
+    def __init__(self, parent, title, task):
+        self.task = task
+        self.window = tk.Toplevel(parent)
+        self.window.title(title)
+        self.window.resizable(False, False)
+        self.window.transient(parent)
+        self.window.protocol("WM_DELETE_WINDOW", self.cancel)
+
+        self.label = tk.Label(self.window, text=f"{title}...", width=40, anchor=tk.W)
+        self.label.pack(padx=10, pady=(10, 5))
+        self.bar = ttk.Progressbar(self.window, length=300, mode="indeterminate")
+        self.bar.pack(padx=10, pady=5)
+        self.bar.start(10) # moves back and forth until the task reports real progress
+        tk.Button(self.window, text="Cancel", command=self.cancel, width=12).pack(pady=(5, 10))
+
+    def update_progress(self, done, total, text=""):
+        if self.window is None:
+            return
+        if total: # without a total the bar keeps moving and only the text changes
+            if str(self.bar["mode"]) != "determinate":
+                self.bar.stop()
+                self.bar.config(mode="determinate")
+            self.bar.config(maximum=total, value=done)
+        if text:
+            self.label.config(text=text)
+
+    def cancel(self):
+        self.task.cancel()
+        self.close()
+
+    def close(self):
+        if self.window is not None:
+            self.window.destroy()
+            self.window = None
+
+
+RENTAL_COLUMNS = [("username", "User", 120), ("car_model", "Car Model", 140), ("start_date", "From", 100),
+                  ("end_date", "To", 100), ("rent_amount", "Amount ($)", 100)]
+FEEDBACK_COLUMNS = [("username", "Customer", 110), ("car_model", "Car Model", 120), ("timestamp", "Date", 140),
+                    ("feedback_text", "Feedback", 300)]
+FEEDBACK_SEARCH_COLUMNS = FEEDBACK_COLUMNS + [("score", "Score", 60)]
+MODEL_REVENUE_COLUMNS = [("car_model", "Car Model", 150), ("rentals", "Rentals", 70), ("revenue", "Revenue ($)", 110),
+                         ("days_booked", "Days Booked", 90), ("active", "Out Now", 70),
+                         ("utilization", "Fleet Out", 80)]
+CUSTOMER_REVENUE_COLUMNS = [("username", "Customer", 200), ("rentals", "Rentals", 100), ("revenue", "Revenue ($)", 150)]
+DAILY_REVENUE_COLUMNS = [("day", "Start Day", 200), ("rentals", "Rentals", 100), ("revenue", "Revenue ($)", 150)]
+OVERDUE_COLUMNS = [("username", "Customer", 120), ("car_model", "Car Model", 140), ("start_date", "Since", 100),
+                   ("overdue_days", "Days Overdue", 100), ("late_fee", "Late Fee ($)", 100)]
+CAR_COLUMNS = [("car_id", "ID", 60), ("brand", "Brand", 120), ("model", "Model", 160), ("seating_capacity", "Seats", 70),
+               ("rental_price_per_day", "Price/day ($)", 110)]
+CAR_SEARCH_COLUMNS = [("brand", "Brand", 120), ("model", "Model", 160), ("seating_capacity", "Seats", 70),
+                      ("rental_price_per_day", "Price/day ($)", 110), ("availability", "Available", 90)]
+PERFORMANCE_COLUMNS = [("operation", "Operation", 140), ("calls", "Calls", 60), ("last_ms", "Last (ms)", 75),
+                       ("p50_ms", "p50 (ms)", 70), ("p95_ms", "p95 (ms)", 70), ("p99_ms", "p99 (ms)", 70),
+                       ("max_ms", "Max (ms)", 75), ("rows_read", "Rows Read", 80), ("rows_written", "Rows Written", 90),
+                       ("bytes_read", "Bytes Read", 90), ("bytes_written", "Bytes Written", 95)]
+METRICS_FILE_TYPES = [("JSON", "*.json"), ("Prometheus text", "*.prom")]
+IMPORT_FILE_TYPES = [("CSV or JSONL", "*.csv *.jsonl *.ndjson"), ("All files", "*.*")]
+
+
+class VirtualTreeview(tk.Frame):
+    """Treeview that only holds the rows on screen. `rows` can be any sequence (len() and indexing),
+    e.g. a table's row list; the visible slice is read from it again on every scroll, so opening
+    the view takes the same time for 100 or 1M records. Double-click a row to see all of it."""
+
+    def __init__(self, parent, columns, rows, row_height=22):
+        super().__init__(parent)
+        self.columns = columns # (field, heading, width) for each column
+        self.rows = rows
+        self.offset = 0 # index of the first row on screen
+        self.page = 20 # rows that fit on screen, updated when the window is resized
+        self.row_height = row_height
+
+        ttk.Style(self).configure("Virtual.Treeview", rowheight=row_height)
+        self.tree = ttk.Treeview(self, columns=[field for field, _, _ in columns], show="headings",
+                                 selectmode="browse", style="Virtual.Treeview")
+        for field, heading, width in columns:
+            self.tree.heading(field, text=heading)
+            self.tree.column(field, width=width, anchor=tk.W)
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.on_scrollbar)
+        self.status = tk.Label(self, anchor=tk.W)
+
+        self.status.pack(side=tk.BOTTOM, fill=tk.X)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<MouseWheel>", lambda event: self.scroll_to(self.offset - 3 * (1 if event.delta > 0 else -1)))
+        self.tree.bind("<Button-4>", lambda event: self.scroll_to(self.offset - 3)) # mouse wheel on Linux
+        self.tree.bind("<Button-5>", lambda event: self.scroll_to(self.offset + 3))
+        self.tree.bind("<Prior>", lambda event: self.scroll_to(self.offset - self.page))
+        self.tree.bind("<Next>", lambda event: self.scroll_to(self.offset + self.page))
+        self.tree.bind("<Home>", lambda event: self.scroll_to(0))
+        self.tree.bind("<End>", lambda event: self.scroll_to(len(self.rows)))
+        self.tree.bind("<Double-1>", self.show_details)
+        self.render()
+
+    def render(self):
+        """Show rows[offset:offset + page]"""
+        total = len(self.rows)
+        self.offset = max(0, min(self.offset, total - self.page))
+        self.tree.delete(*self.tree.get_children())
+        end = min(self.offset + self.page, total)
+        for i in range(self.offset, end):
+            row = self.rows[i]
+            self.tree.insert("", tk.END, values=[str(row.get(field, "")).replace("\n", " ")
+                                                 for field, _, _ in self.columns])
+        if total:
+            self.scrollbar.set(self.offset / total, end / total)
+            self.status.config(text=f"Showing {self.offset + 1:,}-{end:,} of {total:,}")
+        else:
+            self.scrollbar.set(0, 1)
+            self.status.config(text="Nothing to show")
+
+    def scroll_to(self, offset):
+        self.offset = offset
+        self.render()
+        return "break"
+
+    def set_rows(self, rows):
+        self.rows = rows
+        self.scroll_to(0)
+
+    def on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * len(self.rows)))
+        elif action == "scroll":
+            self.scroll_to(self.offset + int(amount) * (self.page if unit == "pages" else 1))
+
+    def on_resize(self, event):
+        page = max(1, event.height // self.row_height - 1) # one row's worth is taken by the headings
+        if page != self.page:
+            self.page = page
+            self.render()
+
+    def selected_row(self):
+        """The row selected on screen, or None"""
+        items = self.tree.selection()
+        return self.rows[self.offset + self.tree.index(items[0])] if items else None
+
+    def show_details(self, event):
+        item = self.tree.identify_row(event.y)
+        if item:
+            row = self.rows[self.offset + self.tree.index(item)]
+            messagebox.showinfo("Details", "\n".join(f"{heading}: {row.get(field, '')}"
+                                                      for field, heading, _ in self.columns), parent=self)
+
+
+def show_rows_window(parent, title, columns, rows, geometry="800x600"):
+    """Window listing rows in a VirtualTreeview"""
+    window = tk.Toplevel(parent) #creates new window which floats over main window
+    window.title(title)
+    window.geometry(geometry)
+    VirtualTreeview(window, columns, rows).pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+    tk.Button(window, text="Close", command=window.destroy, width=15).pack(pady=10)
+    return window
+
+
+def show_feedback_search(parent, service):
+    """Feedback window with a search box (keywords, car model, customer, date range). It starts with
+    all feedback listed; searches go through the feedback index, so they are quick at any size."""
+    window = tk.Toplevel(parent)
+    window.title("Customer Feedback")
+    window.geometry("850x600")
+
+    form = tk.Frame(window)
+    form.pack(fill=tk.X, padx=10, pady=5)
+    fields = {}
+    for i, (name, label, width) in enumerate((("keywords", "Keywords", 30), ("car_model", "Car Model", 15),
+                                              ("username", "Customer", 15), ("start_date", "From (YYYY-MM-DD)", 12),
+                                              ("end_date", "To (YYYY-MM-DD)", 12))):
+        tk.Label(form, text=label).grid(row=i // 3, column=i % 3 * 2, sticky=tk.W)
+        fields[name] = tk.Entry(form, width=width)
+        fields[name].grid(row=i // 3, column=i % 3 * 2 + 1, sticky=tk.W, padx=(0, 10), pady=2)
+    summary = tk.Label(window, anchor=tk.W)
+    summary.pack(fill=tk.X, padx=10)
+    view = VirtualTreeview(window, FEEDBACK_SEARCH_COLUMNS, service.all_feedback())
+
+    def search(event=None):
+        values = {name: entry.get().strip() or None for name, entry in fields.items()}
+        try:
+            start_date, end_date = parse_date(values["start_date"]), parse_date(values["end_date"])
+        except ValueError:
+            messagebox.showerror("Error", "Please enter the dates as YYYY-MM-DD.", parent=window)
+            return
+        started = time.perf_counter()
+        total, rows = service.search_feedback(values["keywords"] or "", values["car_model"], values["username"],
+                                              start_date, end_date)
+        view.set_rows(rows)
+        summary.config(text=f"{total:,} matches in {(time.perf_counter() - started) * 1000:.1f} ms"
+                            + (f" (best {len(rows):,} shown)" if total > len(rows) else ""))
+
+    tk.Button(form, text="Search", command=search, width=10).grid(row=1, column=4, sticky=tk.W)
+    for entry in fields.values():
+        entry.bind("<Return>", search)
+    view.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+    tk.Button(window, text="Close", command=window.destroy, width=15).pack(pady=10)
+    fields["keywords"].focus_set()
+    return window
+
+
+def show_car_search(parent, service, on_rent=None):
+    """Window for browsing the cars available now: filter by brand, seats and price per day, sort
+    and page through the models. Each page comes from the car search index, so it is quick however
+    big the fleet is. With on_rent, a "Rent Selected" button calls on_rent(model) for the chosen one."""
+    window = tk.Toplevel(parent)
+    window.title("Available Cars")
+    window.geometry("700x600")
+
+    form = tk.Frame(window)
+    form.pack(fill=tk.X, padx=10, pady=5)
+    fields = {}
+    for i, (name, label, width) in enumerate((("brand", "Brand", 15), ("min_seats", "Seats from", 6),
+                                              ("max_seats", "to", 6), ("min_price", "Price/day from", 8),
+                                              ("max_price", "to", 8))):
+        tk.Label(form, text=label).grid(row=i // 3, column=i % 3 * 2, sticky=tk.W)
+        fields[name] = tk.Entry(form, width=width)
+        fields[name].grid(row=i // 3, column=i % 3 * 2 + 1, sticky=tk.W, padx=(0, 10), pady=2)
+    sort = ttk.Combobox(form, values=[name.title() for name in CAR_SEARCH_SORTS], state="readonly", width=8)
+    sort.current(0)
+    descending = tk.BooleanVar(value=False)
+    tk.Label(form, text="Sort by").grid(row=1, column=4, sticky=tk.W)
+    sort.grid(row=1, column=5, sticky=tk.W, pady=2)
+    tk.Checkbutton(form, text="Descending", variable=descending).grid(row=2, column=5, sticky=tk.W)
+    summary = tk.Label(window, anchor=tk.W)
+    summary.pack(fill=tk.X, padx=10)
+    view = VirtualTreeview(window, CAR_SEARCH_COLUMNS, [])
+    pager = tk.Frame(window)
+    state = {"offset": 0, "total": 0}
+
+    def search(event=None, offset=0):
+        values = {name: entry.get().strip() or None for name, entry in fields.items()}
+        started = time.perf_counter()
+        try:
+            total, rows = service.search_cars(values["brand"], values["min_seats"], values["max_seats"],
+                                              values["min_price"], values["max_price"], sort.get().lower(),
+                                              descending.get(), offset)
+        except ServiceError as e:
+            messagebox.showerror(e.title, str(e), parent=window)
+            return
+        state.update(offset=offset, total=total)
+        view.set_rows(rows)
+        pages = max(1, -(-total // CAR_SEARCH_PAGE))
+        summary.config(text=f"{total:,} models with cars available, page {offset // CAR_SEARCH_PAGE + 1} of {pages:,} "
+                            f"({(time.perf_counter() - started) * 1000:.1f} ms)")
+
+    def previous_page():
+        if state["offset"] > 0:
+            search(offset=max(0, state["offset"] - CAR_SEARCH_PAGE))
+
+    def next_page():
+        if state["offset"] + CAR_SEARCH_PAGE < state["total"]:
+            search(offset=state["offset"] + CAR_SEARCH_PAGE)
+
+    def rent_selected():
+        row = view.selected_row()
+        if row is None:
+            messagebox.showinfo("Rent a Car", "Please select a car first.", parent=window)
+            return
+        on_rent(row["model"])
+
+    tk.Button(form, text="Search", command=search, width=10).grid(row=2, column=4, sticky=tk.W)
+    for entry in fields.values():
+        entry.bind("<Return>", search)
+    sort.bind("<<ComboboxSelected>>", search)
+    tk.Button(pager, text="< Previous", width=12, command=previous_page).pack(side=tk.LEFT)
+    tk.Button(pager, text="Next >", width=12, command=next_page).pack(side=tk.LEFT, padx=5)
+    if on_rent:
+        tk.Button(pager, text="Rent Selected", width=15, command=rent_selected).pack(side=tk.LEFT, padx=5)
+    tk.Button(pager, text="Close", command=window.destroy, width=12).pack(side=tk.RIGHT)
+    view.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+    pager.pack(fill=tk.X, padx=10, pady=10)
+    search()
+    fields["brand"].focus_set()
+    return window
+
+
+def show_performance(parent):
+    """Window with the latest timings of every instrumented operation (see Metrics), updated every
+    PERFORMANCE_REFRESH_MS while it is open. Collecting can be switched off here, which leaves
+    the timers and counters doing next to nothing."""
+    window = tk.Toplevel(parent)
+    window.title("Performance")
+    window.geometry("1050x450")
+
+    summary = tk.Label(window, anchor=tk.W, justify=tk.LEFT)
+    summary.pack(fill=tk.X, padx=10, pady=5)
+    view = VirtualTreeview(window, PERFORMANCE_COLUMNS, [])
+    buttons = tk.Frame(window)
+    collecting = tk.BooleanVar(value=metrics.enabled)
+
+    def refresh():
+        if not window.winfo_exists():
+            return
+        snapshot = metrics.snapshot()
+        view.rows = [dict(stats, operation=name) for name, stats in
+                     sorted(snapshot["operations"].items(), key=lambda item: -item[1]["total_seconds"])]
+        view.render() # keeps the scroll position, unlike set_rows
+        counters = snapshot["counters"]
+        summary.config(text=f"Since {snapshot['started'].replace('T', ' ')}"
+                            f"{'' if metrics.enabled else ' (collecting is off)'}: "
+                            f"{counters.get('rows_read', 0):,} rows / {counters.get('bytes_read', 0):,} bytes read, "
+                            f"{counters.get('rows_written', 0):,} rows / {counters.get('bytes_written', 0):,} bytes "
+                            f"written. Slowest in total first; percentiles are over the last {METRICS_RECENT} calls.")
+        window.after(PERFORMANCE_REFRESH_MS, refresh)
+
+    def export():
+        file_path = filedialog.asksaveasfilename(parent=window, title="Export Metrics", defaultextension=".json",
+                                                 filetypes=METRICS_FILE_TYPES)
+        if file_path:
+            metrics.export(file_path)
+            messagebox.showinfo("Export Metrics", f"Metrics written to {file_path}", parent=window)
+
+    tk.Checkbutton(buttons, text="Collect metrics", variable=collecting,
+                   command=lambda: setattr(metrics, "enabled", collecting.get())).pack(side=tk.LEFT)
+    tk.Button(buttons, text="Reset", command=metrics.reset, width=10).pack(side=tk.LEFT, padx=5)
+    tk.Button(buttons, text="Export...", command=export, width=10).pack(side=tk.LEFT, padx=5)
+    tk.Button(buttons, text="Close", command=window.destroy, width=10).pack(side=tk.RIGHT)
+    view.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+    buttons.pack(fill=tk.X, padx=10, pady=10)
+    refresh()
+    return window
 
 
 class AdminPanel: #AdminPanel Class
-    def __init__(self, root):
+    def __init__(self, root, tasks=None):
         self.root = root
         self.root.title("Admin Panel")
 
@@ -178,14 +3917,19 @@ class AdminPanel: #AdminPanel Class
         tk.Button(root, text="View Feedback", command=self.view_feedback).pack()
         tk.Button(root, text="Set Rental Balance", command=self.set_admin_balance).pack(pady=5)
         tk.Button(root, text="View Current Balance", command=self.view_current_balance).pack(pady=5)
+        tk.Button(root, text="Revenue Dashboard", command=self.view_dashboard).pack(pady=5)
+        tk.Button(root, text="Overdue Rentals", command=self.view_overdue).pack(pady=5)
+        tk.Button(root, text="Import Cars", command=lambda: self.import_file("cars")).pack()
+        tk.Button(root, text="Export Cars", command=lambda: self.export_file("cars")).pack()
+        tk.Button(root, text="Import Customers", command=lambda: self.import_file("users")).pack()
+        tk.Button(root, text="Export Customers", command=lambda: self.export_file("users")).pack()
+        tk.Button(root, text="Performance", command=lambda: show_performance(self.root)).pack(pady=5)
+
+        self.service = RentalService()
+        self.tasks = tasks or BackgroundTasks(root) # changes are saved in the background
 
     def view_current_balance(self):
-        users = read_csv(USERS_FILE) #read csv file
-        admin_user = next((user for user in users if user["username"] == FIXED_ADMIN_USERNAME), None) #Next function helps to iterate over the list
-        if admin_user:
-            messagebox.showinfo("Current Balance", f"Your current balance is: ${float(admin_user['balance']):.2f}")
-        else:
-            messagebox.showinfo("Current Balance", f"Your current balance is: ${DEFAULT_ADMIN_BALANCE:.2f}")
+        messagebox.showinfo("Current Balance", f"Your current balance is: ${self.service.admin_balance():.2f}")
 
     def set_admin_balance(self):
         """Set admin's rental balance with validation"""
@@ -196,81 +3940,79 @@ class AdminPanel: #AdminPanel Class
         )
 
         if new_balance is not None:  # If user didn't cancel
-            users = read_csv(USERS_FILE)
-            admin_found = False
-
-            for user in users:
-                if user["username"] == FIXED_ADMIN_USERNAME:
-                    user["balance"] = str(new_balance)
-                    admin_found = True
-                    break
+            self.tasks.submit(self.service.set_admin_balance, new_balance,
+                              on_done=lambda _: messagebox.showinfo("Success", f"Balance set to ${new_balance:.2f}"))
+
+    def view_dashboard(self):
+        """Revenue and utilization from the running totals; opening it does not read the rental history"""
+        report = self.service.revenue_report()
+        models = report["by_model"]
+
+        dashboard_win = tk.Toplevel(self.root)
+        dashboard_win.title("Revenue Dashboard")
+        dashboard_win.geometry("800x600")
+
+        tk.Label(dashboard_win, font=("Arial", 12),
+                 text=f"Total revenue: ${report['total_revenue']:,.2f}    Rentals: {report['rental_count']:,}    "
+                      f"Cars out right now: {sum(model['active'] for model in models):,}").pack(pady=10)
+
+        notebook = ttk.Notebook(dashboard_win)
+        notebook.pack(fill=tk.BOTH, expand=True, padx=10)
+        for title, columns, rows in (("By Car Model", MODEL_REVENUE_COLUMNS, models),
+                                     ("Top Customers", CUSTOMER_REVENUE_COLUMNS, report["top_customers"]),
+                                     ("By Day", DAILY_REVENUE_COLUMNS, report["by_day"])):
+            notebook.add(VirtualTreeview(notebook, columns, rows), text=title)
+
+        tk.Button(dashboard_win, text="Close", command=dashboard_win.destroy, width=15).pack(pady=10)
+
+    def view_overdue(self):
+        """Bills every rental in the background, then lists the overdue ones"""
+        def billed(billing):
+            report = billing.report()
+            overdue = billing.overdue_rentals()
+            if not overdue:
+                messagebox.showinfo("Overdue Rentals", "No rentals are overdue.")
+                return
+            window = show_rows_window(self.root, "Overdue Rentals", OVERDUE_COLUMNS, overdue)
+            window.title(f"Overdue Rentals: {report['overdue']:,} owing ${report['late_fees']:,.2f} in late fees")
 
-            # If admin not found in users.csv, create a new entry
-            if not admin_found:
-                admin_user = {
-                    "username": FIXED_ADMIN_USERNAME,
-                    "password": FIXED_ADMIN_PASSWORD,
-                    "first_name": "Admin",
-                    "last_name": "User",
-                    "address": "System",
-                    "balance": str(new_balance),
-                    "role": "admin"
-                }
-                users.append(admin_user)
+        self.tasks.submit(self.service.billing, on_done=billed, title="Billing rentals")
 
-            write_csv(USERS_FILE, users,
-                      ["username", "password", "first_name", "last_name",
-                       "address", "balance", "role"])
+    def import_file(self, table):
+        """Bulk import of cars or customers from a CSV/JSONL file, checked and saved in the background"""
+        file_path = filedialog.askopenfilename(title=f"Import {table}", filetypes=IMPORT_FILE_TYPES)
+        if not file_path:
+            return
 
-            messagebox.showinfo("Success", f"Balance set to ${new_balance:.2f}")
+        def imported(result):
+            errors = result["errors"]
+            message = f"{result['imported']:,} {table} imported, {len(errors):,} rows rejected."
+            if errors:
+                message += "\n\n" + "\n".join(f"Row {row}: {error}" for row, error in errors[:15])
+                if len(errors) > 15:
+                    message += f"\n... and {len(errors) - 15:,} more"
+            messagebox.showinfo("Import Finished", message)
+
+        function = self.service.import_cars if table == "cars" else self.service.import_users
+        self.tasks.submit(function, file_path, on_done=imported, title=f"Importing {table}", report_progress=True)
+
+    def export_file(self, table):
+        file_path = filedialog.asksaveasfilename(title=f"Export {table}", filetypes=IMPORT_FILE_TYPES,
+                                                 defaultextension=".csv")
+        if not file_path:
+            return
+        function = self.service.export_cars if table == "cars" else self.service.export_users
+        self.tasks.submit(function, file_path, title=f"Exporting {table}",
+                          on_done=lambda count: messagebox.showinfo("Export Finished", f"{count:,} {table} written to {file_path}"))
 
     def view_feedback(self):
-        feedbacks = read_csv(FEEDBACK_FILE) #read csv file
+        feedbacks = self.service.all_feedback()
 
         if not feedbacks:
             messagebox.showinfo("No Feedback", "No feedback submitted yet.")
             return
 
-        feedback_win = tk.Toplevel(self.root) #creates new window which floats over main window
-        feedback_win.title("Customer Feedback")
-        feedback_win.geometry("700x500")
-
-        main_frame = tk.Frame(feedback_win)
-        main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-
-        scrollbar = tk.Scrollbar(main_frame)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-
-        feedback_text = tk.Text(
-            main_frame,
-            wrap=tk.WORD,
-            yscrollcommand=scrollbar.set,
-            font=("Arial", 10),
-            padx=10,
-            pady=10
-        )
-        feedback_text.pack(fill=tk.BOTH, expand=True)
-
-        scrollbar.config(command=feedback_text.yview)
-
-        for fb in feedbacks:
-            feedback_text.insert(tk.END,
-                                 f"Customer: {fb['username']}\n"
-                                 f"Car Model: {fb['car_model']}\n"
-                                 f"Date: {fb['timestamp']}\n"
-                                 f"Feedback:\n{fb['feedback_text']}\n"
-                                 f"{'=' * 50}\n\n"
-                                 )
-
-        feedback_text.config(state=tk.DISABLED)
-
-        close_btn = tk.Button(
-            feedback_win,
-            text="Close",
-            command=feedback_win.destroy,
-            width=15
-        )
-        close_btn.pack(pady=10)
+        show_feedback_search(self.root, self.service)
 
     def add_car(self):
         try:
@@ -279,22 +4021,8 @@ class AdminPanel: #AdminPanel Class
             seating_capacity = simpledialog.askinteger("Add Car", "Enter Seating Capacity:")#simple dialog pop up asking for int input
             rental_price = simpledialog.askfloat("Add Car", "Enter Rental Price Per Day:")#simple dialog pop up asking for float input
 
-            if not all([brand, model, seating_capacity, rental_price]):
-                messagebox.showerror("Input Error", "All fields are required!")
-                return
-
-            if rental_price < 0:
-                messagebox.showerror("Input Error", "Rental price must be positive!")
-                return
-
-            if seating_capacity <= 0:
-                messagebox.showerror("Input Error", "Seating capacity must be at least 1!")
-                return
-
-            new_car = Car(brand, model, seating_capacity, rental_price)
-            new_car.save_to_csv()
-            messagebox.showinfo("Success", f"Car {brand} {model} added successfully!")
-
+            self.tasks.submit(self.service.add_car, brand, model, seating_capacity, rental_price,
+                              on_done=lambda _: messagebox.showinfo("Success", f"Car {brand} {model} added successfully!"))
         except ValueError as ve:
             messagebox.showerror("Value Error", f"Invalid input: {ve}")
         except Exception as e:
@@ -302,122 +4030,34 @@ class AdminPanel: #AdminPanel Class
 
     def remove_car(self):
         try:
-            model_name = simpledialog.askstring("Remove Car", "Enter Model Name to Remove:") #simple dialog pop up asking for string input
-            if not model_name:
-                messagebox.showerror("Input Error", "Model name is required!")
+            model_name = simpledialog.askstring("Remove Car", "Enter a Car ID, or a Model Name to remove every car of that model:") #simple dialog pop up asking for string input
+            if self.service.find_car(model_name): # one car by its ID
+                self.tasks.submit(self.service.remove_car_unit, model_name,
+                                  on_done=lambda car: messagebox.showinfo("Success", f"Car {car.car_id} ({car.model}) removed successfully!"))
                 return
-
-            cars = read_csv(CARS_FILE) #read csv file
-            updated_cars = [car for car in cars if car["model"].lower() != model_name.lower()]
-
-            if len(updated_cars) == len(cars):
-                messagebox.showerror("Not Found", f"No car found with model: {model_name}")
-                return
-
-            write_csv(CARS_FILE, updated_cars,
-                      ["brand", "model", "seating_capacity", "rental_price_per_day", "is_available"])
-            messagebox.showinfo("Success", f"Car {model_name} removed successfully!")
-
+            self.tasks.submit(self.service.remove_car, model_name,
+                              on_done=lambda _: messagebox.showinfo("Success", f"Car {model_name} removed successfully!"))
         except FileNotFoundError:
             messagebox.showerror("File Error", "Car data file not found.")
         except Exception as e:
             messagebox.showerror("Error", f"An unexpected error occurred:\n{e}")
 
     def view_all_rentals(self):
-        rentals = read_csv(RENTALS_FILE) #read csv file
+        rentals = self.service.all_rentals()
         if not rentals:
             messagebox.showinfo("No Rentals", "No rentals found!")
             return
 
-        rental_win = tk.Toplevel(self.root) #create new window which floats over main window
-        rental_win.title("All Rentals")
-        rental_win.geometry("800x600")
-
-        main_frame = tk.Frame(rental_win)
-        main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-
-        scrollbar = tk.Scrollbar(main_frame)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-
-        rental_text = tk.Text(
-            main_frame,
-            wrap=tk.WORD,
-            yscrollcommand=scrollbar.set,
-            font=("Arial", 10),
-            padx=10,
-            pady=10
-        )
-        rental_text.pack(fill=tk.BOTH, expand=True)
-
-        scrollbar.config(command=rental_text.yview)
-
-        for r in rentals:
-            rental_text.insert(tk.END,
-                               f"User: {r['username']}\n"
-                               f"Car Model: {r['car_model']}\n"
-                               f"From: {r['start_date']} | To: {r['end_date']}\n"
-                               f"Amount: ${r['rent_amount']}\n"
-                               f"{'=' * 50}\n\n"
-                               )
-
-        rental_text.config(state=tk.DISABLED) # disabled mode indicates the display in read-only mode
-
-        close_btn = tk.Button(
-            rental_win,
-            text="Close",
-            command=rental_win.destroy,
-            width=15
-        )
-        close_btn.pack(pady=10)
+        show_rows_window(self.root, "All Rentals", RENTAL_COLUMNS, rentals)
 
     def view_reserved_cars(self):
-        cars = read_csv(CARS_FILE) #read csv file
-        reserved_cars = [car for car in cars if car["is_available"] == "False"]
+        reserved_cars = self.service.reserved_cars()
 
         if not reserved_cars:
             messagebox.showinfo("No Reserved Cars", "No cars are currently reserved.")
             return
 
-        reserved_win = tk.Toplevel(self.root) #create new window which floats over main window
-        reserved_win.title("Reserved Cars")
-        reserved_win.geometry("700x500")
-
-        main_frame = tk.Frame(reserved_win)
-        main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-
-        scrollbar = tk.Scrollbar(main_frame)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-
-        reserved_text = tk.Text(
-            main_frame,
-            wrap=tk.WORD,
-            yscrollcommand=scrollbar.set,
-            font=("Arial", 10),
-            padx=10,
-            pady=10
-        )
-        reserved_text.pack(fill=tk.BOTH, expand=True)
-
-        scrollbar.config(command=reserved_text.yview)
-
-        for car in reserved_cars:
-            reserved_text.insert(tk.END,
-                                 f"Brand: {car['brand']}\n"
-                                 f"Model: {car['model']}\n"
-                                 f"Seats: {car['seating_capacity']}\n"
-                                 f"Price/day: ${car['rental_price_per_day']}\n"
-                                 f"{'=' * 50}\n\n"
-                                 )
-
-        reserved_text.config(state=tk.DISABLED)
-
-        close_btn = tk.Button(
-            reserved_win,
-            text="Close",
-            command=reserved_win.destroy,
-            width=15
-        )
-        close_btn.pack(pady=10)
+        show_rows_window(self.root, "Reserved Cars", CAR_COLUMNS, reserved_cars, "700x500")
 
 
 class CarRentalApp:
@@ -434,66 +4074,70 @@ class CarRentalApp:
         self.register_button = tk.Button(root, text="Register", command=self.show_register)
         self.register_button.pack()
 
+        self.service = RentalService()
+        self.tasks = BackgroundTasks(root) # file work runs here so the window never freezes
+        self.flush_task = None
+
+        # The data is loaded in the background; logging in has to wait until it is there
+        self.login_button.config(state=tk.DISABLED)
+        self.register_button.config(state=tk.DISABLED)
+        self.load_data()
+
+    def load_data(self):
+        self.tasks.submit(get_repository, on_done=self.data_loaded, on_error=self.load_failed,
+                          on_cancel=self.load_cancelled, title="Loading data", report_progress=True)
+
+    def load_cancelled(self):
+        # nothing works without the data, so either load it again or close the app
+        if messagebox.askretrycancel("Loading Cancelled", "The app cannot be used until the data is loaded.\n"
+                                                          "Load it again? (Cancel closes the app)"):
+            self.load_data()
+        else:
+            self.root.destroy()
+
+    def data_loaded(self, repository):
+        self.login_button.config(state=tk.NORMAL)
+        self.register_button.config(state=tk.NORMAL)
+        self.root.after(FLUSH_INTERVAL_MS, self.flush_changes)
+
+    def load_failed(self, error):
+        messagebox.showerror("File Error", f"Could not load data:\n{error}")
+        self.root.destroy()
+
+    def flush_changes(self):
+        """Periodically writes the in-memory changes back to the CSV files (write-behind)"""
+        if not (self.flush_task and self.flush_task.running()): # skip a round while the last one is still writing
+            self.flush_task = self.tasks.submit(
+                get_repository().flush,
+                on_error=lambda e: messagebox.showerror("File Error", f"Could not save data:\n{e}"))
+        self.root.after(FLUSH_INTERVAL_MS, self.flush_changes)
+
     def view_feedback(self):
-        feedbacks = read_csv(FEEDBACK_FILE) #read csv file
+        feedbacks = self.service.all_feedback()
         if not feedbacks:
             messagebox.showinfo("Info", "No feedback yet")
             return
 
-        all_feedback = "\n\n".join(
-            f"User: {fb['username']}\nCar: {fb['car_model']}\n"
-            f"Feedback: {fb['feedback_text']}\nDate: {fb['timestamp']}\n"
-            for fb in feedbacks
-        )
-        messagebox.showinfo("Feedback", all_feedback)
+        show_feedback_search(self.root, self.service)
 
     def return_car(self, user):
-        rentals = read_csv(RENTALS_FILE) #read csv file
-        user_rentals = [r for r in rentals if r["username"] == user.username and r["end_date"] == "Ongoing"]
-
-        if not user_rentals:
+        if not self.service.ongoing_rentals(user.username):
             messagebox.showinfo("Return Car", "No ongoing rentals to return.")
             return
 
         car_model = simpledialog.askstring("Return Car", "Enter car model to return:") # dialog pops up asking for string input
-        rental = next((r for r in user_rentals if r["car_model"].lower() == car_model.lower()), None) #loop run for each car in "cars" list
-
-        if not rental:
-            messagebox.showerror("Error", "Rental not found.")
+        if not car_model:
             return
 
-        expected_days = 1  # assume rental was for 1 day
-        rented_date = datetime.strptime(rental["start_date"], "%Y-%m-%d")
-        current_date = datetime.now()
-        days_rented = (current_date - rented_date).days
-
-        extra_fee = 0
-        if days_rented > expected_days:
-            extra_days = days_rented - expected_days
-            extra_fee = extra_days * float(rental["rent_amount"])
-
-        rental["end_date"] = current_date.strftime("%Y-%m-%d")
-        write_csv(RENTALS_FILE, rentals, ["username", "car_model", "start_date", "end_date", "rent_amount"])
-
-        cars = read_csv(CARS_FILE) #read csv file
-        for car in cars:
-            if car["model"] == rental["car_model"]:
-                car["is_available"] = "True"
-                break
-        write_csv(CARS_FILE, cars, ["brand", "model", "seating_capacity", "rental_price_per_day", "is_available"])
+        self.tasks.submit(self.service.return_car, user, car_model, on_done=self.car_returned)
 
+    def car_returned(self, result):
+        rental, extra_fee = result
         if extra_fee > 0:
-            user.balance -= extra_fee
             messagebox.showinfo("Late Return", f"Returned late! Extra fee of ${extra_fee} deducted.")
         else:
             messagebox.showinfo("Return Success", "Car returned successfully!")
 
-        users = read_csv(USERS_FILE) #read csv file
-        for u in users:
-            if u["username"] == user.username:
-                u["balance"] = str(user.balance)
-        write_csv(USERS_FILE, users, ["username", "password", "first_name", "last_name", "address", "balance", "role"])
-
     def show_register(self):
         self.register_window = tk.Toplevel(self.root)
         self.register_window.title("Register")
@@ -533,47 +4177,18 @@ class CarRentalApp:
             address = self.reg_address.get()
             balance = self.reg_balance.get()
 
-            if not all([username, password, first_name, last_name, address, balance]):
-                messagebox.showerror("Error", "All fields are required!")
-                return
-
-            if username.lower() == FIXED_ADMIN_USERNAME.lower():
-                messagebox.showerror("Error", "This username is reserved")
-                return
-
-            try:
-                balance = float(balance)
-                if balance < 0:
-                    raise ValueError("Balance cannot be negative")
-            except ValueError as e:
-                messagebox.showerror("Error", f"Invalid balance: {e}")
-                return
-
-            users = read_csv(USERS_FILE) #read csv file
-            if any(user["username"].lower() == username.lower() for user in users):
-                messagebox.showerror("Error", "Username already exists!")
-                return
-
-            new_user = User(
-                username,
-                password,
-                first_name,
-                last_name,
-                address,
-                balance,
-                "customer"
-            )
-            new_user.save_to_csv()
-
-            messagebox.showinfo("Success", "Registration Successful!")
-            self.register_window.destroy()
-
+            self.tasks.submit(self.service.register, username, password, first_name, last_name, address, balance,
+                              on_done=self.registered)
         except Exception as e:
             messagebox.showerror("Error", f"Registration failed: {str(e)}")
 
+    def registered(self, user):
+        messagebox.showinfo("Success", "Registration Successful!")
+        self.register_window.destroy()
+
     def show_admin_panel(self):
         admin_window = tk.Toplevel(self.root)
-        AdminPanel(admin_window)
+        AdminPanel(admin_window, self.tasks)
 
     def show_login(self):
         self.login_window = tk.Toplevel(self.root)
@@ -598,52 +4213,43 @@ class CarRentalApp:
                 messagebox.showerror("Error", "Please enter both username and password.")
                 return
 
-            user = User.authenticate(username, password)
+            def checked(user):
+                if user:
+                    messagebox.showinfo("Login Success", f"Welcome, {username}!")
+                    self.login_window.destroy()
+                    self.show_dashboard(user)
+                else:
+                    messagebox.showerror("Login Failed", "Invalid username or password")
 
-            if user:
-                messagebox.showinfo("Login Success", f"Welcome, {username}!")
-                self.login_window.destroy()
-                self.show_dashboard(user)
-            else:
-                messagebox.showerror("Login Failed", "Invalid username or password")
+            # checking a password hash takes a moment and may re-save it, so it runs in the background
+            self.tasks.submit(self.service.authenticate, username, password, on_done=checked)
 
         except Exception as e:
             messagebox.showerror("Unexpected Error", f"Something went wrong:\n{str(e)}")
 
     def show_all_customers_rentals(self):
-        rentals = read_csv(RENTALS_FILE)
+        rentals = self.service.all_rentals()
         if not rentals:
             messagebox.showinfo("Customer Rentals", "No active rentals found.")
             return
 
-        rental_info = "\n".join(
-            [
-                f"User: {r['username']} - Car: {r['car_model']} - From: {r['start_date']} - To: {r['end_date']} - Amount: ${r['rent_amount']}"
-                for r in rentals]
-        )
-        messagebox.showinfo("Customer Rentals Report", rental_info)
+        show_rows_window(self.root, "Customer Rentals Report", RENTAL_COLUMNS, rentals)
 
     def show_reserved_cars(self):
-        cars = read_csv(CARS_FILE)
-        reserved_cars = [car for car in cars if car["is_available"] == "False"]
+        reserved_cars = self.service.reserved_cars()
 
         if not reserved_cars:
             messagebox.showinfo("Reserved Cars", "No cars are currently reserved.")
             return
 
-        car_list = "\n".join(
-            [
-                f"{car['brand']} {car['model']} - Seats: {car['seating_capacity']} - Price: ${car['rental_price_per_day']} per day"
-                for car in reserved_cars]
-        )
-        messagebox.showinfo("Reserved Cars Report", car_list)
+        show_rows_window(self.root, "Reserved Cars Report", CAR_COLUMNS, reserved_cars, "700x500")
 
     def show_dashboard(self, user):
         self.dashboard_window = tk.Toplevel(self.root)
         self.dashboard_window.title("Dashboard")
 
         tk.Label(self.dashboard_window, text=f"Welcome, {user.first_name} {user.last_name}").pack()
-        tk.Button(self.dashboard_window, text="View Available Cars", command=self.show_available_cars).pack()
+        tk.Button(self.dashboard_window, text="View Available Cars", command=lambda: self.show_available_cars(user)).pack()
         tk.Button(self.dashboard_window, text="Rent a Car", command=lambda: self.rent_car(user)).pack()
         tk.Button(self.dashboard_window, text="View Rental History",
                   command=lambda: self.view_rental_history(user)).pack()
@@ -668,10 +4274,7 @@ class CarRentalApp:
 
     def set_admin_balance(self):
         """Method to set admin's balance from the dashboard"""
-        users = read_csv(USERS_FILE)
-        admin_user = next((user for user in users if user["username"] == FIXED_ADMIN_USERNAME), None)
-
-        if not admin_user:
+        if not self.service.repository.find_user(FIXED_ADMIN_USERNAME):
             messagebox.showerror("Error", "Admin user not found!")
             return
 
@@ -682,16 +4285,8 @@ class CarRentalApp:
         ) #A simple dialog box pop up asking for float input
 
         if new_balance is not None:
-            for user in users:
-                if user["username"] == FIXED_ADMIN_USERNAME:
-                    user["balance"] = str(new_balance)
-                    break
-
-            write_csv(USERS_FILE, users,
-                      ["username", "password", "first_name", "last_name",
-                       "address", "balance", "role"])
-
-            messagebox.showinfo("Success", f"Balance set to ${new_balance:.2f}")
+            self.tasks.submit(self.service.set_admin_balance, new_balance,
+                              on_done=lambda _: messagebox.showinfo("Success", f"Balance set to ${new_balance:.2f}"))
 
     def add_car(self):
         try:
@@ -700,17 +4295,8 @@ class CarRentalApp:
             seating_capacity = simpledialog.askinteger("Add Car", "Enter seating capacity:")
             rental_price_per_day = simpledialog.askfloat("Add Car", "Enter rental price per day:")
 
-            if not (brand and model and seating_capacity and rental_price_per_day):
-                messagebox.showerror("Error", "All fields are required!")
-                return
-            if seating_capacity is None or seating_capacity <= 0 or rental_price_per_day is None or rental_price_per_day <= 0:
-                messagebox.showerror("Error", "Number you have entered must be positive")
-                return
-
-            car = Car(brand, model, seating_capacity, rental_price_per_day, "True")
-            car.save_to_csv()
-
-            messagebox.showinfo("Success", f"{brand} {model} added successfully!")
+            self.tasks.submit(self.service.add_car, brand, model, seating_capacity, rental_price_per_day,
+                              on_done=lambda _: messagebox.showinfo("Success", f"{brand} {model} added successfully!"))
 
         except ValueError:
             messagebox.showerror("Input Error", "Invalid number for seating capacity or rental price.")
@@ -718,50 +4304,28 @@ class CarRentalApp:
             messagebox.showerror("Unexpected Error", f"Something went wrong:\n{str(e)}")
 
     def give_feedback(self, user):
-        rentals = read_csv(RENTALS_FILE) #read csv file
-        user_rentals = [r for r in rentals if r["username"] == user.username]
-
-        if not user_rentals:
+        if not self.service.rental_history(user.username):
             messagebox.showinfo("No Rentals", "You must rent a car before giving feedback.")
             return
 
         car_model = simpledialog.askstring("Feedback", "Enter the car model you want to review:")
-        rental_found = any(r["car_model"].lower() == car_model.lower() for r in user_rentals)
-
-        if not rental_found:
+        if not self.service.has_rented(user.username, car_model):
             messagebox.showerror("Error", "You haven't rented this car model.")
             return
 
         feedback_text = simpledialog.askstring("Feedback", "Enter your feedback about the car and service:")
-        if not feedback_text:
-            messagebox.showerror("Error", "Feedback cannot be empty.")
-            return
-
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        fb = Feedback(user.username, car_model, feedback_text, timestamp)
-        fb.save_to_csv()
-
-        messagebox.showinfo("Thank You!", "Thankyou for your feedback.")
+        self.tasks.submit(self.service.give_feedback, user, car_model, feedback_text,
+                          on_done=lambda _: messagebox.showinfo("Thank You!", "Thankyou for your feedback."))
 
     def remove_car(self):
         try:
-            cars = read_csv(CARS_FILE) #read csv file
-            car_model = simpledialog.askstring("Remove Car", "Enter car model to remove:") # a simple dialog box pop up asking for string input
-
-            if not car_model:
-                messagebox.showerror("Error", "Car model is required!")
+            car_model = simpledialog.askstring("Remove Car", "Enter a car ID, or a car model to remove every car of that model:") # a simple dialog box pop up asking for string input
+            if self.service.find_car(car_model): # one car by its ID
+                self.tasks.submit(self.service.remove_car_unit, car_model,
+                                  on_done=lambda car: messagebox.showinfo("Success", f"Car {car.car_id} ({car.model}) removed successfully!"))
                 return
-
-            updated_cars = [car for car in cars if car["model"].lower() != car_model.lower()]
-
-            if len(updated_cars) == len(cars):
-                messagebox.showerror("Error", "Car not found!")
-                return
-
-            write_csv(CARS_FILE, updated_cars,
-                      ["brand", "model", "seating_capacity", "rental_price_per_day", "is_available"])
-
-            messagebox.showinfo("Success", f"{car_model} removed successfully!")
+            self.tasks.submit(self.service.remove_car, car_model,
+                              on_done=lambda _: messagebox.showinfo("Success", f"{car_model} removed successfully!"))
 
         except FileNotFoundError:
             messagebox.showerror("File Error", f"The file {CARS_FILE} was not found.")
@@ -770,102 +4334,71 @@ class CarRentalApp:
         except Exception as e:
             messagebox.showerror("Unexpected Error", f"Something went wrong:\n{str(e)}")
 
-    def show_available_cars(self):
-        cars = Car.get_available_cars()
-        car_list = "\n".join(
-            [f"{car['brand']} {car['model']} - ${car['rental_price_per_day']} per day" for car in cars])
-        messagebox.showinfo("Available Cars", car_list if car_list else "No cars available")
+    def show_available_cars(self, user=None):
+        # searchable list; customers can rent the selected model straight from it
+        show_car_search(self.root, self.service, on_rent=(lambda model: self.rent_car(user, model)) if user else None)
 
-    def rent_car(self, user):
-        cars = Car.get_available_cars()
-        if not cars:
-            messagebox.showerror("Error", "No cars available for rent.")
+    def rent_car(self, user, car_model=None):
+        start_text = simpledialog.askstring("Rent a Car", "Start date (YYYY-MM-DD):",
+                                            initialvalue=date.today().strftime("%Y-%m-%d"))
+        if not start_text:
             return
-
-        car_selection = simpledialog.askstring("Rent a Car", "Enter car model to rent:")
-        selected_car = next((car for car in cars if car["model"].lower() == car_selection.lower()), None)
-
-        if not selected_car:
-            messagebox.showerror("Error", "Car not found.")
+        try:
+            start_date = datetime.strptime(start_text.strip(), "%Y-%m-%d").date()
+        except ValueError:
+            messagebox.showerror("Error", "Please enter the start date as YYYY-MM-DD.")
             return
-
-        rental_price = float(selected_car["rental_price_per_day"])
-        if user.balance < rental_price:
-            messagebox.showerror("Error", "Insufficient balance.")
+        if start_date < date.today():
+            messagebox.showerror("Error", "The start date cannot be in the past.")
             return
 
         rental_days = simpledialog.askinteger("Rental Duration", "For how many days do you want to rent the car?")
         if not rental_days or rental_days <= 0:
             messagebox.showerror("Error", "Please enter a valid number of days.")
             return
+        end_date = start_date + timedelta(days=rental_days)
 
-        total_price = rental_price * rental_days
-
-        if user.balance < total_price:
-            messagebox.showerror("Error", f"Insufficient balance. Total cost would be ${total_price:.2f}")
-            return
-
-        payment_method = simpledialog.askstring(
-            "Payment Method", "Choose Payment Method: Credit Card / Debit Card / Cash"
-        ).lower() #a simple dialog box pop up asking for string input
-
-        if payment_method not in ["credit card", "debit card", "cash"]: # payment method: debit or credit card
-            messagebox.showerror("Payment Error", "Invalid payment method selected.")
+        if not self.service.available_cars(start_date, end_date):
+            messagebox.showerror("Error", "No cars available for rent on these dates.")
             return
 
-        if payment_method in ["credit card", "debit card"]: # payment method: debit or credit card
-            card_number = simpledialog.askstring("Card Payment", "Enter your Card Number (16 digits):")
-            expiry_date = simpledialog.askstring("Card Payment", "Enter Expiry Date (MM/YY):")
-            cvv = simpledialog.askstring("Card Payment", "Enter CVV (3 digits):")
-
-            if not card_number or len(card_number) != 16 or not card_number.isdigit():
-                messagebox.showerror("Payment Error", "Invalid card number.")
-                return
-            if not expiry_date or len(expiry_date) != 5 or expiry_date[2] != '/':
-                messagebox.showerror("Payment Error", "Invalid expiry date format.")
-                return
-            if not cvv or len(cvv) != 3 or not cvv.isdigit():
-                messagebox.showerror("Payment Error", "Invalid CVV.")
-                return
-
-        elif payment_method == "cash": # payment method :cash
-            messagebox.showinfo("Cash Payment", "Please pay the amount at the car pickup.")
+        car_selection = car_model or simpledialog.askstring("Rent a Car", "Enter car model to rent:")
+        try:
+            selected_car, total_price = self.service.quote(user, car_selection, rental_days, start_date)
 
-        # Deduct the total price from user's balance
-        user.balance -= total_price
+            payment_method = (simpledialog.askstring(
+                "Payment Method", "Choose Payment Method: Credit Card / Debit Card / Cash"
+            ) or "").lower() #a simple dialog box pop up asking for string input
+            self.service.check_payment_method(payment_method)
 
-        # Update car availability
-        cars_data = read_csv(CARS_FILE)
-        for car in cars_data:
-            if car["model"] == selected_car["model"]:
-                car["is_available"] = "False"
-                break
+            card_number = expiry_date = cvv = None
+            if payment_method in CARD_PAYMENT_METHODS: # payment method: debit or credit card
+                card_number = simpledialog.askstring("Card Payment", "Enter your Card Number (16 digits):")
+                expiry_date = simpledialog.askstring("Card Payment", "Enter Expiry Date (MM/YY):")
+                cvv = simpledialog.askstring("Card Payment", "Enter CVV (3 digits):")
+                self.service.check_card(card_number, expiry_date, cvv)
 
-        write_csv(CARS_FILE, cars_data, ["brand", "model", "seating_capacity", "rental_price_per_day", "is_available"])
+            elif payment_method == "cash": # payment method :cash
+                messagebox.showinfo("Cash Payment", "Please pay the amount at the car pickup.")
 
-        # Create rental record
-        start_date = datetime.now().strftime("%Y-%m-%d")
-        end_date = (datetime.now() + timedelta(days=rental_days)).strftime("%Y-%m-%d")
-        rental = Rental(user.username, selected_car["model"], start_date, end_date, total_price)
-        rental.save_to_csv()
+        except ServiceError as e:
+            messagebox.showerror(e.title, str(e))
+            return
 
-        # Update user's balance in the database
-        users = read_csv(USERS_FILE) #read csv file
-        for u in users:
-            if u["username"] == user.username:
-                u["balance"] = str(user.balance)
-                break
-        write_csv(USERS_FILE, users, ["username", "password", "first_name", "last_name", "address", "balance", "role"])
+        def rented(rental):
+            messagebox.showinfo("Success",
+                                f"Payment Successful via {payment_method.title()}!\n"
+                                f"You have rented {selected_car['model']} for {rental_days} days "
+                                f"from {start_date} to {end_date}.\n"
+                                f"Total cost: ${total_price:.2f}\n"
+                                f"New balance: ${user.balance:.2f}")
 
-        messagebox.showinfo("Success",
-                            f"Payment Successful via {payment_method.title()}!\n"
-                            f"You have rented {selected_car['model']} for {rental_days} days.\n"
-                            f"Total cost: ${total_price:.2f}\n"
-                            f"New balance: ${user.balance:.2f}")
+        # Books the car and deducts the total price from the user's balance (in the background)
+        self.tasks.submit(self.service.rent, user, selected_car["model"], rental_days, payment_method,
+                          card_number, expiry_date, cvv, start_date, on_done=rented)
 
     def view_rental_history(self, user):
-        rentals = read_csv(RENTALS_FILE)
-        user_rentals = [r for r in rentals if r["username"] == user.username]
+        user_rentals = self.service.rental_history(user.username)
 
         if not user_rentals:
             messagebox.showinfo("Rental History", "No rental history available.")
@@ -877,6 +4410,113 @@ class CarRentalApp:
 
 
 if __name__ == "__main__": # helps to run whole program
-    root = tk.Tk()
-    app = CarRentalApp(root)
-    root.mainloop()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Online Car Rental System")
+    parser.add_argument("--import-csv", action="store_true",
+                        help=f"copy the CSV files into the SQLite database ({SQLITE_FILE}) and exit")
+    parser.add_argument("--stress", type=int, metavar="PROCESSES",
+                        help="book a test fleet from this many processes at once, report bookings/s and exit")
+    parser.add_argument("--stress-cars", type=int, default=500, metavar="CARS",
+                        help="size of the test fleet used by --stress (default 500)")
+    parser.add_argument("--serve", type=int, nargs="?", const=DEFAULT_SERVER_PORT, metavar="PORT",
+                        help=f"serve the rental workflow as HTTP/JSON instead of opening the window "
+                             f"(default port {DEFAULT_SERVER_PORT})")
+    parser.add_argument("--load-test", metavar="URL",
+                        help="send concurrent requests to a --serve instance and report p50/p99 latency")
+    parser.add_argument("--clients", type=int, default=20,
+                        help="concurrent clients used by --load-test and --bench-login (default 20)")
+    parser.add_argument("--requests", type=int, default=50,
+                        help="rounds of browse/rent/history each --load-test client runs (default 50)")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="time the storage and lookup paths on synthetic data, write JSON results and exit")
+    parser.add_argument("--bench-sizes", default=",".join(map(str, BENCHMARK_SIZES)), metavar="ROWS",
+                        help="comma separated rows per table for --benchmark (e.g. 1000,1000000,10000000)")
+    parser.add_argument("--bench-output", default="benchmark.json", metavar="FILE",
+                        help="where --benchmark writes its results (default benchmark.json)")
+    parser.add_argument("--bench-compare", metavar="FILE",
+                        help="earlier --benchmark results to compare against; exits with 1 on a regression")
+    parser.add_argument("--bench-login", action="store_true",
+                        help=f"time concurrent logins (--clients threads) at the current password hashing cost; "
+                             f"exits with 1 below {LOGIN_TARGET_PER_SECOND} logins/s")
+    parser.add_argument("--settle", nargs="?", const="", metavar="YYYY-MM-DD",
+                        help="close every overdue ongoing rental as of that day (default today), charge the late "
+                             f"fees, log to {SETTLEMENT_LOG_FILE} and exit")
+    parser.add_argument("--import-cars", metavar="FILE",
+                        help="add the cars in a CSV or JSONL file to the fleet, print the rejected rows and exit")
+    parser.add_argument("--import-users", metavar="FILE",
+                        help="add the customers in a CSV or JSONL file, print the rejected rows and exit")
+    parser.add_argument("--export-cars", metavar="FILE", help="write the fleet to a CSV or JSONL file and exit")
+    parser.add_argument("--export-users", metavar="FILE", help="write every account to a CSV or JSONL file and exit")
+    parser.add_argument("--billing-report", action="store_true",
+                        help="bill every rental as of today, print the totals and the most overdue rentals and exit")
+    parser.add_argument("--metrics-file", metavar="FILE",
+                        help="write the timings and I/O counters to this file on exit (Prometheus text for .prom, "
+                             "JSON otherwise)")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="run the app under a profiler and on exit write the profile to FILE and a summary of "
+                             "the hottest functions and the time taken by each button next to it (session.prof: "
+                             "session-summary.txt)")
+    parser.add_argument("--profile-mode", choices=["cprofile", "sample"], default="cprofile",
+                        help="cProfile (every call, default) or a sampling thread (less overhead) for --profile")
+    parser.add_argument("--profile-top", type=int, default=PROFILE_TOP, metavar="N",
+                        help=f"functions listed in the --profile summary (default {PROFILE_TOP})")
+    parser.add_argument("--no-metrics", action="store_true",
+                        help="do not collect timings and counters (same as CAR_RENTAL_METRICS=off)")
+    args = parser.parse_args()
+    if args.no_metrics:
+        metrics.enabled = False
+    if args.metrics_file:
+        atexit.register(metrics.export, args.metrics_file)
+
+    if args.import_csv:
+        backend = SQLiteBackend(SQLITE_FILE)
+        for table, count in backend.import_csv().items():
+            print(f"{table}: {count} rows imported")
+        backend.close()
+    elif args.stress:
+        raise SystemExit(0 if run_stress_test(args.stress, args.stress_cars) else 1)
+    elif args.benchmark:
+        results = run_benchmark([int(size) for size in args.bench_sizes.split(",")])
+        save_benchmark(args.bench_output, results)
+        if args.bench_compare and compare_benchmarks(args.bench_compare, results):
+            raise SystemExit(1)
+    elif args.bench_login:
+        raise SystemExit(0 if run_login_benchmark(args.clients) else 1)
+    elif args.settle is not None:
+        summary = RentalService().settle_overdue(parse_date(args.settle))
+        print(f"settled {summary['rentals']} overdue rentals of {summary['customers']} customers, "
+              f"${summary['late_fees']:,.2f} in late fees charged")
+    elif args.import_cars or args.import_users:
+        service = RentalService()
+        result = service.import_cars(args.import_cars) if args.import_cars else service.import_users(args.import_users)
+        for row, error in result["errors"]:
+            print(f"row {row}: {error}")
+        print(f"{result['imported']} imported, {len(result['errors'])} rejected")
+        raise SystemExit(1 if result["errors"] else 0)
+    elif args.export_cars:
+        print(f"{RentalService().export_cars(args.export_cars)} cars written to {args.export_cars}")
+    elif args.export_users:
+        print(f"{RentalService().export_users(args.export_users)} accounts written to {args.export_users}")
+    elif args.billing_report:
+        billing = RentalService().billing()
+        print(json.dumps(billing.report(), indent=2))
+        for rental in billing.overdue_rentals()[:10]:
+            print(f"{rental['username']:<15}{rental['car_model']:<20}since {rental['start_date']}  "
+                  f"{rental['overdue_days']:>4} days overdue  ${rental['late_fee']:,.2f}")
+    elif args.serve:
+        try:
+            asyncio.run(BookingServer(port=args.serve).serve())
+        except KeyboardInterrupt:
+            pass
+    elif args.load_test:
+        raise SystemExit(0 if run_load_test(args.load_test, args.clients, args.requests) else 1)
+    else:
+        profiler = SessionProfiler(args.profile, args.profile_mode, args.profile_top) if args.profile else None
+        if profiler:
+            profiler.start()
+        try:
+            root = tk.Tk()
+            app = CarRentalApp(root)
+            root.mainloop()
+        finally:
+            if profiler:
+                print(profiler.stop())
\ No newline at end of file
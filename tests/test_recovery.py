@@ -0,0 +1,84 @@
+"""Crash recovery of the CSV backend: redo log replay and interrupted checkpoints"""
+import importlib.util
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+APP_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "G2-10_1.py")
+spec = importlib.util.spec_from_file_location("car_rental", APP_FILE) # the file name is not importable as it is
+app = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(app)
+
+RENTAL = {"username": "bob", "car_model": "Civic", "start_date": "2024-01-01", "end_date": "2024-01-03",
+          "rent_amount": "20.0", "car_id": "1"}
+
+
+class RecoveryTest(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+        self.redo_log = os.path.join(self.data_dir, app.REDO_LOG_FILE)
+
+    def load(self):
+        repository = app.Repository(self.data_dir, app.CSVBackend(self.data_dir))
+        repository.load()
+        self.addCleanup(repository.close)
+        return repository
+
+    def commit_rental(self):
+        """A committed booking that only the redo log holds so far (as after a crash before the flush)"""
+        repository = self.load()
+        with repository.transaction():
+            repository.insert_car({"brand": "Honda", "model": "Civic", "seating_capacity": "4",
+                                   "rental_price_per_day": "10.0", "is_available": "True"})
+            repository.rentals.insert(RENTAL)
+        return repository
+
+    def test_torn_last_line_is_dropped(self):
+        self.commit_rental()
+        with open(self.redo_log, "ab") as file:
+            file.write(b'{"transaction": [["rentals", "insert", 2, {"username": "ev')
+        repository = self.load()
+        self.assertEqual([rental.username for rental in repository.rentals.rows], ["bob"])
+        with open(self.redo_log, "rb") as file:
+            self.assertTrue(file.read().endswith(b"\n")) # the torn transaction never committed
+
+    def test_crash_between_checkpoint_line_and_rename(self):
+        repository = self.commit_rental()
+        with repository.transaction():
+            repository.rentals.update(repository.rentals.rows[0], {"rent_amount": "30.0"}) # not append-only: rewritten
+        with mock.patch.object(app.os, "replace", side_effect=OSError("crash")):
+            with self.assertRaises(OSError):
+                repository.flush()
+        with open(self.redo_log) as file:
+            self.assertIn("checkpoint", json.loads(file.readlines()[-1]))
+
+        repository = self.load()
+        self.assertFalse(os.path.exists(self.redo_log)) # the renames were finished instead of replaying
+        self.assertEqual([float(rental.rent_amount) for rental in repository.rentals.rows], [30.0])
+        self.assertEqual(len(repository.cars.rows), 1)
+        self.assertFalse(any(name.endswith(".tmp") for name in os.listdir(self.data_dir)))
+
+    def test_replaying_the_same_log_twice(self):
+        self.commit_rental()
+        with open(self.redo_log, "rb") as file:
+            log = file.read()
+
+        first = self.load()
+        first.flush() # the rows are now in the CSV files
+        self.assertFalse(os.path.exists(self.redo_log))
+        with open(self.redo_log, "wb") as file: # as if the log had not been emptied after the flush
+            file.write(log)
+
+        second = self.load()
+        self.assertEqual(len(second.rentals.rows), 1)
+        self.assertEqual(len(second.cars.rows), 1)
+        second.flush()
+        self.assertEqual(len(self.load().rentals.rows), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()